@@ -1,10 +1,34 @@
+import argparse
+import importlib.util
+import os
 import sys
-from interfaces.cli_interface import run_cli
-from interfaces.api_interface import app as api_app
+
+def serve_api(argv):
+    parser = argparse.ArgumentParser(description="KAIRO API server")
+    parser.add_argument("--api", action="store_true")
+    parser.add_argument("--dev", action="store_true", help="use Flask's single-process development server")
+    parser.add_argument("--bind", default=os.getenv("KAIRO_BIND", "0.0.0.0:5000"))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("KAIRO_WORKERS", "4")))
+    parser.add_argument("--threads", type=int, default=int(os.getenv("KAIRO_THREADS", "32")))
+    args = parser.parse_args(argv)
+    print("🌐 KAIRO API MODE ENABLED")
+
+    if args.dev or os.name == "nt" or importlib.util.find_spec("gunicorn") is None:
+        from api_interface import run_dev_server
+        host, _, port = args.bind.rpartition(":")
+        run_dev_server(host=host or "0.0.0.0", port=int(port))
+        return
+
+    # gunicorn.conf.py reads these; exec so gunicorn receives SIGTERM/SIGHUP directly
+    os.environ.update(KAIRO_BIND=args.bind, KAIRO_WORKERS=str(args.workers), KAIRO_THREADS=str(args.threads))
+    here = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(here)
+    os.execv(sys.executable, [sys.executable, "-m", "gunicorn", "-c", os.path.join(here, "gunicorn.conf.py"), "api_interface:app"])
 
 if __name__ == "__main__":
+    # Each mode imports only what it needs; the API pulls in Flask and Bitcoin
     if "--api" in sys.argv:
-        print("🌐 KAIRO API MODE ENABLED")
-        api_app.run(host="0.0.0.0", port=5000)
+        serve_api(sys.argv[1:])
     else:
-        run_cli()
+        from cli_interface import run_cli
+        run_cli(sys.argv[1:])
@@ -0,0 +1,160 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import metrics
+
+
+class Overloaded(Exception):
+    """Raised when a request is not admitted; carries the HTTP status and Retry-After"""
+
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """An admitted request's slot; release() is idempotent"""
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.controller._release(time.monotonic() - self.started)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class AdmissionController:
+    """Load shedding in front of the LLM path.
+
+    Each client has a token bucket refilled at ``rate`` requests per second
+    up to ``burst``; an empty bucket is rejected with 429. At most
+    ``max_inflight`` admitted requests run at once; up to ``max_queue``
+    more wait in FIFO order until a slot frees or their deadline passes,
+    and anything beyond that is rejected with 503 straight away. Waiting
+    requests hold a server thread, so ``max_inflight + max_queue`` should
+    stay below the worker's thread count to leave threads for /health and
+    /metrics. Limits apply per worker process.
+    """
+
+    def __init__(self, rate=5.0, burst=20, max_inflight=16, max_queue=8, queue_timeout=2.0, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_clients = max_clients
+        self.stats_counters = {'admitted': 0, 'queued': 0, 'rate_limited': 0, 'queue_full': 0, 'timed_out': 0}
+
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # client -> [tokens, last refill]
+        self._inflight = 0
+        self._waiters = deque()  # Events of queued requests, oldest first
+        self._service_time = 1.0  # moving average, seconds per admitted request
+
+    @classmethod
+    def from_env(cls):
+        """Build a controller from the KAIRO_* environment
+
+        By default half of the worker's gthread threads (KAIRO_THREADS) may
+        run LLM requests and a quarter may wait, so once more than three
+        quarters of a worker's threads are on the LLM path the rest are
+        shed with 503. Load that keeps every thread busy needs
+        KAIRO_MAX_INFLIGHT/KAIRO_ADMISSION_QUEUE raised to match.
+        """
+        threads = int(os.getenv('KAIRO_THREADS', '32'))
+        return cls(
+            rate=float(os.getenv('KAIRO_CLIENT_RATE', '5')),
+            burst=float(os.getenv('KAIRO_CLIENT_BURST', '20')),
+            max_inflight=int(os.getenv('KAIRO_MAX_INFLIGHT', str(max(1, threads // 2)))),
+            max_queue=int(os.getenv('KAIRO_ADMISSION_QUEUE', str(threads // 4))),
+            queue_timeout=float(os.getenv('KAIRO_ADMISSION_TIMEOUT_MS', '2000')) / 1000
+        )
+
+    def _take_token(self, client):
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = [self.burst, now]
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return None
+        return (1 - bucket[0]) / self.rate
+
+    def _queue_wait(self):
+        # Rough time until a new arrival would get a slot
+        return self._service_time * (len(self._waiters) + 1) / self.max_inflight
+
+    def _reject(self, status, reason, counter, retry_after):
+        self.stats_counters[counter] += 1
+        metrics.ADMISSION_REJECTED.labels(counter).inc()
+        raise Overloaded(status, reason, max(1, math.ceil(retry_after)))
+
+    def admit(self, client, timeout=None):
+        """Admit a request from client, waiting at most timeout seconds for a slot.
+
+        Returns a Ticket to release when the request finishes, or raises
+        Overloaded.
+        """
+        timeout = self.queue_timeout if timeout is None else min(timeout, self.queue_timeout)
+        with self._lock:
+            wait = self._take_token(client)
+            if wait is not None:
+                self._reject(429, 'Rate limit exceeded', 'rate_limited', wait)
+            if self._inflight < self.max_inflight and not self._waiters:
+                self._inflight += 1
+                self.stats_counters['admitted'] += 1
+                return Ticket(self)
+            if len(self._waiters) >= self.max_queue or timeout <= 0:
+                self._reject(503, 'Server is at capacity', 'queue_full', self._queue_wait())
+            turn = threading.Event()
+            self._waiters.append(turn)
+            self.stats_counters['queued'] += 1
+
+        if not turn.wait(timeout):
+            with self._lock:
+                # The slot may have been handed over just as the wait timed out
+                if not turn.is_set():
+                    self._waiters.remove(turn)
+                    self._reject(503, 'Timed out waiting for capacity', 'timed_out', self._queue_wait())
+        with self._lock:
+            self.stats_counters['admitted'] += 1
+        return Ticket(self)
+
+    def _release(self, duration):
+        with self._lock:
+            self._service_time += 0.1 * (duration - self._service_time)
+            if self._waiters:
+                # Hand the slot straight to the oldest waiter so it can't be overtaken
+                self._waiters.popleft().set()
+            else:
+                self._inflight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.stats_counters,
+                'inflight': self._inflight,
+                'waiting': len(self._waiters),
+                'max_inflight': self.max_inflight,
+                'max_queue': self.max_queue
+            }
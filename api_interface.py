@@ -1,17 +1,28 @@
-from flask import Flask, request, jsonify
-from memory import Memory
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from memory import InvalidCursor, Memory
 from decision_engine import DecisionEngine
-import psutil
 import os
+import functools
+import hmac
+import json
+import signal
+import zlib
+import threading
+import time
+import uuid
 from datetime import datetime
 import logging
 from healthcheck import HealthCheck, EnvironmentDump
-import json_logger
-from bitcoin_armory_integration import BitcoinArmoryManager, register_bitcoin_endpoints
+import log_pipeline
+import metrics
+import tracing
+from admission import AdmissionController, Overloaded
+from profiler import ProfilerBusy, SamplingProfiler, collapsed
+from system_sampler import SystemSampler
 
-# Configure logging
-logger = json_logger.JsonLogger()
-logging.basicConfig(level=logging.INFO)
+# Configure logging; records are formatted and written off the request thread
+log_pipeline.setup_logging()
+logger = logging.getLogger('KairoAI.API')
 app = Flask(__name__)
 
 # Initialize health check
@@ -22,69 +33,329 @@ envdump = EnvironmentDump(app, "/environment")
 memory = Memory()
 engine = DecisionEngine(memory)
 
-# Initialize BitcoinArmory manager
-btc_manager = BitcoinArmoryManager()
+# Bounds concurrent and per-client LLM requests so bursts are shed early
+admission = AdmissionController.from_env()
 
-# Register Bitcoin endpoints
-register_bitcoin_endpoints(app, btc_manager)
+# Comma-separated addresses of reverse proxies or gateways that may say who
+# the client is (X-Client-ID, else X-Forwarded-For). Anyone else is rate
+# limited by their own address, whatever headers they send.
+TRUSTED_PROXIES = {addr.strip() for addr in os.getenv("KAIRO_TRUSTED_PROXIES", "").split(",") if addr.strip()}
+
+# Bounds for paginated reads and bulk imports
+MEMORY_PAGE_MAX = int(os.getenv("KAIRO_MEMORY_PAGE_MAX", "1000"))
+MEMORY_IMPORT_CHUNK = int(os.getenv("KAIRO_MEMORY_IMPORT_CHUNK", "1000"))
+
+# /admin and bulk memory endpoints are served only when a token is configured
+ADMIN_TOKEN = os.getenv("KAIRO_ADMIN_TOKEN")
+profiler = SamplingProfiler()
+
+# The Bitcoin subsystem is an optional component; armoryengine itself is
+# only imported when the manager starts or preload() runs
+BITCOIN_ENABLED = os.getenv("KAIRO_ENABLE_BITCOIN", "1").lower() not in ("0", "false", "no")
+btc_manager = None
+if BITCOIN_ENABLED:
+    from bitcoin_armory_integration import BitcoinArmoryManager, register_bitcoin_endpoints
+
+    # Initialize BitcoinArmory manager
+    btc_manager = BitcoinArmoryManager()
+
+    # Register Bitcoin endpoints
+    register_bitcoin_endpoints(app, btc_manager)
+
+# Health and status read this snapshot instead of sampling per request.
+# It starts on first use so each gunicorn worker runs its own thread.
+sampler = SystemSampler(
+    interval=float(os.getenv("KAIRO_SAMPLER_INTERVAL", "5")),
+    btc_manager=btc_manager
+)
+
+def preload():
+    """Import lazily loaded dependencies now (gunicorn master, before forking)"""
+    from nlp_processor import load_openai
+    load_openai()
+    if BITCOIN_ENABLED:
+        from bitcoin_armory_integration import load_armory
+        load_armory()
+
+# Components with threads or connections are started once per serving
+# process: by gunicorn's post_worker_init hook, or before the dev server runs
+_started_pid = None
+_lifecycle_lock = threading.Lock()
+
+def startup():
+    """Start this process's background components (idempotent per process)"""
+    global _started_pid
+    with _lifecycle_lock:
+        if _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+    sampler.start()
+    try:
+        # Build the pooled LLM clients now rather than on the first request
+        engine.nlp.warm()
+    except Exception as e:
+        logger.error(f"Failed to create LLM clients: {e}")
+    if btc_manager is not None:
+        try:
+            btc_manager.start()
+            logger.info("BitcoinArmory manager started successfully")
+        except Exception as e:
+            logger.error(f"Failed to start BitcoinArmory manager: {e}")
+
+def shutdown(drain_timeout=None):
+    """Drain queued work and stop components (worker exit or SIGTERM)"""
+    global _started_pid
+    with _lifecycle_lock:
+        if _started_pid != os.getpid():
+            return
+        _started_pid = None
+    if drain_timeout is None:
+        drain_timeout = float(os.getenv("KAIRO_DRAIN_TIMEOUT", "10"))
+    if btc_manager is not None:
+        try:
+            btc_manager.stop(drain_timeout=drain_timeout)
+        except Exception as e:
+            logger.error(f"Error stopping BitcoinArmory manager: {e}")
+    engine.coalescer.close()
+    sampler.stop()
+    memory.close()
+    logger.info("Components stopped")
+    log_pipeline.shutdown()
 
 # Add health checks
 def check_disk_usage():
-    disk = psutil.disk_usage('/')
-    if disk.percent > 90:
+    if sampler.snapshot()["system"]["disk_percent"] > 90:
         return False, "Disk usage is above 90%"
     return True, "Disk usage is OK"
 
 def check_memory_usage():
-    memory = psutil.virtual_memory()
-    if memory.percent > 90:
+    if sampler.snapshot()["system"]["memory_percent"] > 90:
         return False, "Memory usage is above 90%"
     return True, "Memory usage is OK"
 
 def check_cpu_usage():
-    cpu = psutil.cpu_percent(interval=1)
-    if cpu > 90:
+    if sampler.snapshot()["system"]["cpu_percent"] > 90:
         return False, "CPU usage is above 90%"
     return True, "CPU usage is OK"
 
 def check_bitcoin_status():
-    try:
-        btc_manager.get_balance()
+    bitcoin = sampler.snapshot()["bitcoin"]
+    if bitcoin["status"] == "operational":
         return True, "BitcoinArmory is operational"
-    except Exception as e:
-        return False, f"BitcoinArmory error: {str(e)}"
+    return False, f"BitcoinArmory error: {bitcoin.get('error', bitcoin['status'])}"
 
 # Add the checks
 health.add_check(check_disk_usage)
 health.add_check(check_memory_usage)
 health.add_check(check_cpu_usage)
-health.add_check(check_bitcoin_status)
+if BITCOIN_ENABLED:
+    health.add_check(check_bitcoin_status)
 
 # Add environment information
 def application_data():
-    return {
+    data = {
         "maintainer": "KairoAI",
         "git_repo": "https://github.com/yourusername/KairoAI",
-        "version": "1.0.0",
-        "bitcoin_armory": {
+        "version": "1.0.0"
+    }
+    if btc_manager is not None:
+        data["bitcoin_armory"] = {
             "version": "0.96.5",
             "network": btc_manager.config['network'],
             "wallet_path": btc_manager.config['wallet_path']
         }
-    }
+    return data
 
 envdump.add_section("application", application_data)
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    # Log records from this request, the engine and the LLM call share this ID
+    g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    log_pipeline.request_id.set(g.request_id)
+    g.trace_span = tracing.start("request", method=request.method, path=request.path)
+
+@app.after_request
+def record_request_latency(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.observe_request(request.method, route, response.status_code, time.perf_counter() - start)
+    if "request_id" in g:
+        response.headers["X-Request-ID"] = g.request_id
+    return response
+
+@app.teardown_request
+def finish_request_trace(exc):
+    tracing.finish(g.pop("trace_span", None), error=type(exc).__name__ if exc else None)
+    profiler.request_finished()
+
+@app.errorhandler(Overloaded)
+def overloaded(e):
+    response = jsonify({"error": e.reason})
+    response.status_code = e.status
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+def require_admin(view):
+    """Allow the view only with an "Authorization: Bearer <KAIRO_ADMIN_TOKEN>" header"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({"error": "Admin endpoints are disabled"}), 404
+        supplied = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(supplied.encode(), f"Bearer {ADMIN_TOKEN}".encode()):
+            return jsonify({"error": "Unauthorized"}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+def client_identity():
+    """Who the current request counts against for per-client rate limits"""
+    peer = request.remote_addr
+    if peer not in TRUSTED_PROXIES:
+        return peer
+    client_id = request.headers.get("X-Client-ID")
+    if client_id:
+        return f"id:{client_id}"
+    # The nearest address not added by one of our own proxies
+    forwarded = [addr.strip() for addr in request.headers.get("X-Forwarded-For", "").split(",") if addr.strip()]
+    for addr in reversed(forwarded):
+        if addr not in TRUSTED_PROXIES:
+            return addr
+    return peer
+
+def admit_request():
+    """Admit the current request or raise Overloaded"""
+    return admission.admit(client_identity(), timeout=request.headers.get("X-Request-Timeout", type=float))
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    metrics.MEMORY_ENTRIES.set(len(memory))
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
 @app.route("/health", methods=["GET"])
 def health_check():
     return jsonify({"status": "healthy", "service": "kairo-ai"})
 
 @app.route("/api/memory", methods=["GET"])
 def get_memory():
+    """Newest count entries, or one page of entries when cursor or limit is given"""
+    try:
+        if "cursor" in request.args or "limit" in request.args:
+            limit = min(max(request.args.get("limit", 100, type=int), 1), MEMORY_PAGE_MAX)
+            entries, next_cursor = memory.page(
+                request.args.get("cursor"), limit, archived=request.args.get("archived") in ("1", "true")
+            )
+            return jsonify({"entries": entries, "next_cursor": next_cursor})
+        count = request.args.get("count", type=int)
+        return jsonify({"memory": memory.recall(count)})
+    except InvalidCursor:
+        return jsonify({"error": "Invalid cursor"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/memory/export", methods=["GET"])
+@require_admin
+def export_memory():
+    """Stream memory as NDJSON {"seq", "entry"} lines; ?compress=gzip for a .gz file
+
+    ?start=<seq> resumes an interrupted export and ?archived=1 includes
+    cold storage. Entries are read in batches, so memory use stays flat.
+    """
+    try:
+        start = int(request.args["start"]) if "start" in request.args else 0
+    except ValueError:
+        return jsonify({"error": "Invalid start"}), 400
+    archived = request.args.get("archived") in ("1", "true")
+    compress = request.args.get("compress") == "gzip"
+
+    def lines():
+        batch = []
+        for seq, entry in memory.scan(start, archived):
+            batch.append(json.dumps({"seq": seq, "entry": entry}))
+            if len(batch) >= 1000:
+                yield ("\n".join(batch) + "\n").encode("utf-8")
+                batch = []
+        if batch:
+            yield ("\n".join(batch) + "\n").encode("utf-8")
+
+    def gzipped():
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+        for chunk in lines():
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    if compress:
+        return Response(gzipped(), mimetype="application/gzip",
+                        headers={"Content-Disposition": "attachment; filename=memory.ndjson.gz"})
+    return Response(lines(), mimetype="application/x-ndjson",
+                    headers={"Content-Disposition": "attachment; filename=memory.ndjson"})
+
+def _ndjson_records(stream, gzipped):
+    """Parse NDJSON lines from a request body stream, decompressing gzip on the fly
+
+    Raises ValueError naming the line that could not be read.
+    """
+    decompressor = zlib.decompressobj(47) if gzipped else None  # wbits 47: gzip or zlib header
+    pending = b""
+    number = 0
+    while True:
+        chunk = stream.read(64 * 1024)
+        if decompressor is not None:
+            try:
+                chunk = decompressor.decompress(chunk) if chunk else decompressor.flush()
+            except zlib.error as e:
+                raise ValueError(f"Line {number + 1}: invalid gzip data ({e})")
+        if not chunk:
+            break
+        *complete, pending = (pending + chunk).split(b"\n")
+        for line in complete:
+            number += 1
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f"Line {number}: {e}")
+    if pending.strip():
+        try:
+            yield json.loads(pending)
+        except ValueError as e:
+            raise ValueError(f"Line {number + 1}: {e}")
+
+@app.route("/api/memory/import", methods=["POST"])
+@require_admin
+def import_memory():
+    """Append entries from an NDJSON body (Content-Encoding: gzip accepted)
+
+    Each line is an exported {"seq", "entry"} record or a bare entry.
+    Entries get new sequence numbers and are written in chunks while the
+    body is read. A bad line stops the import; entries before it stay
+    imported and the response says how many.
+    """
+    gzipped = request.headers.get("Content-Encoding", "").lower() == "gzip"
+    failure = []
+
+    def entries():
+        try:
+            for record in _ndjson_records(request.stream, gzipped):
+                if isinstance(record, dict) and "seq" in record and "entry" in record:
+                    record = record["entry"]
+                yield record
+        except ValueError as e:
+            # End the import here; everything read so far is still stored
+            failure.append(str(e))
+
     try:
-        return jsonify({"memory": memory.recall()})
+        count, first_seq, last_seq = memory.import_entries(entries(), chunk_size=MEMORY_IMPORT_CHUNK)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    result = {"imported": count, "first_seq": first_seq, "last_seq": last_seq}
+    if failure:
+        return jsonify({"error": failure[0], **result}), 400
+    return jsonify(result)
 
 @app.route("/api/respond", methods=["POST"])
 def respond():
@@ -94,56 +365,131 @@ def respond():
             return jsonify({"error": "Missing input field"}), 400
             
         input_text = data.get("input", "")
-        response = engine.process(input_text)
+        session = data.get("session") or request.headers.get("X-Session-ID")
+        with admit_request():
+            response = engine.process(input_text, use_cache=data.get("cache", True), session=session)
         return jsonify({"response": response})
+    except Overloaded:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/respond/stream", methods=["POST"])
+def respond_stream():
+    """Stream response tokens as NDJSON lines while they are generated"""
+    data = request.json
+    if not data or "input" not in data:
+        return jsonify({"error": "Missing input field"}), 400
+
+    session = data.get("session") or request.headers.get("X-Session-ID")
+    ticket = admit_request()
+    try:
+        tokens = engine.stream(data.get("input", ""), use_cache=data.get("cache", True), session=session)
+    except Exception:
+        ticket.release()
+        raise
+
+    def generate():
+        try:
+            for token in tokens:
+                yield json.dumps({"token": token}) + "\n"
+            yield json.dumps({"done": True}) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+        finally:
+            tokens.close()
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    # The slot is held until the stream is finished or the client goes away
+    response.call_on_close(ticket.release)
+    return response
+
+@app.route("/api/cache", methods=["GET"])
+def cache_stats():
+    if engine.nlp.cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **engine.nlp.cache.stats()})
+
 @app.route('/status', methods=['GET'])
 def status():
     """Get detailed system status"""
     try:
+        snapshot = sampler.snapshot()
         status = {
             "status": "operational",
             "timestamp": datetime.now().isoformat(),
-            "system": {
-                "cpu_percent": psutil.cpu_percent(),
-                "memory_percent": psutil.virtual_memory().percent,
-                "disk_percent": psutil.disk_usage('/').percent,
-                "uptime": psutil.boot_time()
-            },
-            "process": {
-                "pid": os.getpid(),
-                "memory_info": dict(psutil.Process().memory_info()._asdict()),
-                "cpu_percent": psutil.Process().cpu_percent()
-            },
-            "bitcoin": {
-                "status": "operational" if btc_manager.wallet else "no_wallet",
-                "balance": btc_manager.get_balance() if btc_manager.wallet else None
-            }
+            "sampled_at": snapshot["sampled_at"],
+            "system": snapshot["system"],
+            "process": snapshot["process"],
+            "bitcoin": snapshot["bitcoin"],
+            "admission": admission.stats(),
+            "llm": engine.nlp.dispatcher.stats(),
+            "logging": log_pipeline.stats()
         }
         return jsonify(status)
     except Exception as e:
         logger.error("Status check failed", extra={"error": str(e)})
         return jsonify({"status": "error", "message": str(e)}), 500
 
-# Initialize BitcoinArmory on startup
-@app.before_first_request
-def initialize_bitcoin():
+@app.route("/admin/traces", methods=["GET"])
+@require_admin
+def get_traces():
+    """Recent spans, optionally for one request ID or above a duration"""
+    return jsonify({
+        "spans": tracing.spans(
+            limit=request.args.get("limit", 200, type=int),
+            trace_id=request.args.get("request_id"),
+            name=request.args.get("name"),
+            min_ms=request.args.get("min_ms", type=float)
+        ),
+        "stats": tracing.stats()
+    })
+
+@app.route("/admin/profile", methods=["POST"])
+@require_admin
+def profile():
+    """Sample this worker's threads for N seconds or N requests; returns collapsed stacks
+
+    Body: {"seconds": 10} or {"requests": 100, "timeout": 60}, plus an
+    optional "interval_ms". The output feeds flamegraph.pl or speedscope.
+    """
+    data = request.get_json(silent=True) or {}
     try:
-        btc_manager.start()
-        logger.info("BitcoinArmory manager started successfully")
-    except Exception as e:
-        logger.error(f"Failed to start BitcoinArmory manager: {e}")
+        seconds = float(data["seconds"]) if data.get("seconds") else None
+        requests = int(data["requests"]) if data.get("requests") else None
+        timeout = min(float(data.get("timeout", 60)), 600)
+        interval = float(data["interval_ms"]) / 1000 if data.get("interval_ms") else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "seconds, requests, timeout and interval_ms must be numbers"}), 400
+    if not seconds and not requests:
+        return jsonify({"error": "Give seconds or requests"}), 400
+    try:
+        counts, samples, elapsed = profiler.profile(seconds, requests, timeout=timeout, interval=interval)
+    except ProfilerBusy as e:
+        return jsonify({"error": str(e)}), 409
+    return Response(collapsed(counts), mimetype="text/plain", headers={
+        "X-Profile-Samples": str(samples),
+        "X-Profile-Seconds": f"{elapsed:.3f}",
+        "X-Profile-PID": str(os.getpid())
+    })
 
-# Cleanup on shutdown
-@app.teardown_appcontext
-def cleanup_bitcoin(exception=None):
+def run_dev_server(host="0.0.0.0", port=5000):
+    """Serve with Flask's threaded server in this process (development, Windows)"""
+    startup()
+
+    def stop(signum, frame):
+        shutdown()
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, stop)
     try:
-        btc_manager.stop()
-        logger.info("BitcoinArmory manager stopped")
-    except Exception as e:
-        logger.error(f"Error stopping BitcoinArmory manager: {e}")
+        app.run(host=host, port=port, threaded=True)
+    finally:
+        shutdown()
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
+    run_dev_server()
@@ -0,0 +1,124 @@
+"""Logging overhead per request on the calling thread.
+
+A simulated request emits the records one /api/respond produces (API,
+DecisionEngine and NLPProcessor, with ``extra`` fields) from several
+threads at once. Each mode is timed on the request threads only:
+
+    sync      JSON formatted and written inline (a plain StreamHandler)
+    async     log_pipeline queue handler, written by the listener thread
+    sampled   async with the per-request info records sampled at --sample-rate
+
+    python benchmarks/bench_logging.py --requests 20000 --threads 8 --json
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import log_pipeline
+
+LOGGERS = ('KairoAI.API', 'KairoAI.DecisionEngine', 'KairoAI.NLP')
+
+
+def simulated_request(loggers, i):
+    log_pipeline.request_id.set(f"bench-{i}")
+    loggers[2].info("LLM completion", extra={"model": "gpt-4", "duration_ms": 812.5})
+    loggers[1].info("Processed input", extra={"session": "bench", "context_messages": 4, "duration_ms": 815.1})
+    loggers[0].info("Request finished", extra={"route": "/api/respond", "status": 200})
+
+
+def install(mode, path, sample_rate, queue_size):
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    stream = open(path, 'w')
+    if mode == 'sync':
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(log_pipeline.JsonFormatter())
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+    else:
+        rates = {name: sample_rate for name in LOGGERS} if mode == 'sampled' else {}
+        handler = log_pipeline.setup_logging(level='INFO', sample_rates=rates, queue_size=queue_size, stream=stream)
+    return handler, stream
+
+
+def run(mode, requests, threads, sample_rate, queue_size):
+    path = tempfile.mktemp(prefix=f"kairo-bench-log-{mode}-")
+    handler, stream = install(mode, path, sample_rate, queue_size)
+    loggers = [logging.getLogger(name) for name in LOGGERS]
+    per_thread = requests // threads
+    timings = []
+    lock = threading.Lock()
+
+    def worker(offset):
+        local = []
+        for i in range(per_thread):
+            start = time.perf_counter()
+            simulated_request(loggers, offset + i)
+            local.append(time.perf_counter() - start)
+        with lock:
+            timings.extend(local)
+
+    pool = [threading.Thread(target=worker, args=(t * per_thread,)) for t in range(threads)]
+    began = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - began
+
+    stats = log_pipeline.stats() if mode != 'sync' else None
+    if mode == 'sync':
+        logging.getLogger().removeHandler(handler)
+    else:
+        log_pipeline.shutdown()  # drains the queue before the file is measured
+    stream.close()
+    with open(path) as f:
+        written = sum(1 for _ in f)
+    os.unlink(path)
+
+    timings.sort()
+    return {
+        'mode': mode,
+        'requests': len(timings),
+        'threads': threads,
+        'mean_us': round(statistics.fmean(timings) * 1e6, 2),
+        'p99_us': round(timings[int(len(timings) * 0.99) - 1] * 1e6, 2),
+        'requests_per_s': round(len(timings) / elapsed),
+        'records_written': written,
+        'dropped': stats['dropped'] if stats else 0,
+        'sampled_out': stats['sampled_out'] if stats else 0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', nargs='+', default=['sync', 'async', 'sampled'], choices=['sync', 'async', 'sampled'])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--sample-rate', type=float, default=0.1)
+    parser.add_argument('--queue-size', type=int, default=10000)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    rows = [run(mode, args.requests, args.threads, args.sample_rate, args.queue_size) for mode in args.modes]
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'mode':<8} {'mean_us':>9} {'p99_us':>9} {'req/s':>9} {'written':>8} {'dropped':>8} {'sampled':>8}")
+    for row in rows:
+        print(f"{row['mode']:<8} {row['mean_us']:>9} {row['p99_us']:>9} {row['requests_per_s']:>9} "
+              f"{row['records_written']:>8} {row['dropped']:>8} {row['sampled_out']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Append and recall throughput of the Memory stores across worker processes.
+
+Each worker process opens the same store directory, as gunicorn workers
+do, and runs a fixed number of appends followed by recalls. Aggregate
+operations per second are reported for every backend and worker count.
+
+    python benchmarks/bench_memory_store.py --workers 1 4 16 --json
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from memory import STORES, open_store
+
+
+def _worker(backend, path, ops, recall_count, start, results):
+    store = open_store(backend, path=path)
+    start.wait()
+
+    began = time.perf_counter()
+    for i in range(ops):
+        store.append(f"worker entry {i} " + "x" * 64)
+    appended = time.perf_counter()
+    for _ in range(ops):
+        store.tail(recall_count)
+    recalled = time.perf_counter()
+    base, size = store.base, len(store)
+    for _ in range(ops):
+        store.get(base + random.randrange(size))
+    fetched = time.perf_counter()
+
+    store.close()
+    results.put((appended - began, recalled - appended, fetched - recalled))
+
+
+def run(backend, workers, ops, recall_count):
+    path = tempfile.mkdtemp(prefix=f"kairo-bench-{backend}-")
+    try:
+        open_store(backend, path=path).close()
+        ctx = multiprocessing.get_context('fork' if sys.platform != 'win32' else 'spawn')
+        start = ctx.Event()
+        results = ctx.Queue()
+        procs = [
+            ctx.Process(target=_worker, args=(backend, path, ops, recall_count, start, results))
+            for _ in range(workers)
+        ]
+        for p in procs:
+            p.start()
+        start.set()
+        timings = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+    total = ops * workers
+    # Workers run concurrently, so the slowest one bounds each phase
+    append_s, tail_s, get_s = (max(t[i] for t in timings) for i in range(3))
+    return {
+        'backend': backend,
+        'workers': workers,
+        'ops_per_worker': ops,
+        'append_per_s': round(total / append_s),
+        'recall_per_s': round(total / tail_s),
+        'get_per_s': round(total / get_s)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backends', nargs='+', default=sorted(STORES), choices=sorted(STORES))
+    parser.add_argument('--workers', nargs='+', type=int, default=[1, 4, 16])
+    parser.add_argument('--ops', type=int, default=5000, help='operations per worker and phase')
+    parser.add_argument('--recall-count', type=int, default=10)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    rows = [
+        run(backend, workers, args.ops, args.recall_count)
+        for backend in args.backends
+        for workers in args.workers
+    ]
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'backend':<8} {'workers':>7} {'append/s':>10} {'recall/s':>10} {'get/s':>10}")
+    for row in rows:
+        print(f"{row['backend']:<8} {row['workers']:>7} {row['append_per_s']:>10} "
+              f"{row['recall_per_s']:>10} {row['get_per_s']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Startup and import cost of each KairoAI mode.
+
+Every mode runs in a fresh interpreter a few times; the best wall time
+is reported together with the slowest imports taken from
+``python -X importtime``.
+
+    python benchmarks/bench_startup.py --repeat 5 --json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MODES = {
+    'cli': ("import cli_interface", {}),
+    'api': ("import api_interface", {'KAIRO_ENABLE_BITCOIN': '0'}),
+    'api+bitcoin': ("import api_interface", {}),
+    'preload': ("import api_interface; api_interface.preload()", {}),
+}
+
+
+def _run(code, env, importtime=False):
+    args = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    start = time.perf_counter()
+    proc = subprocess.run(args, cwd=ROOT, env=env, capture_output=True, text=True)
+    return time.perf_counter() - start, proc
+
+
+def _top_imports(stderr, limit):
+    """Parse -X importtime output into the slowest packages and modules"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not cumulative_us.strip().isdigit():
+            continue
+        # Top-level packages only; their submodules are already in the total
+        name = name.strip()
+        if '.' not in name and not name.startswith('_'):
+            imports.append({'module': name, 'cumulative_ms': int(cumulative_us) / 1000})
+    imports.sort(key=lambda item: item['cumulative_ms'], reverse=True)
+    return imports[:limit]
+
+
+def measure(mode, repeat, top):
+    code, extra_env = MODES[mode]
+    with tempfile.TemporaryDirectory(prefix='kairo-startup-') as scratch:
+        env = dict(os.environ, KAIRO_MEMORY_DIR=scratch, KAIRO_CACHE_DIR=scratch, **extra_env)
+        times = []
+        for _ in range(repeat):
+            elapsed, proc = _run(code, env)
+            if proc.returncode != 0:
+                return {'mode': mode, 'ok': False, 'error': proc.stderr.strip().splitlines()[-1:]}
+            times.append(elapsed)
+        _, proc = _run(code, env, importtime=True)
+    return {
+        'mode': mode,
+        'ok': True,
+        'best_s': round(min(times), 4),
+        'median_s': round(sorted(times)[len(times) // 2], 4),
+        'top_imports': _top_imports(proc.stderr, top)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=8, help='slowest imports to list per mode')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = [measure(mode, args.repeat, args.top) for mode in args.modes]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        if not result['ok']:
+            print(f"{result['mode']:<12} failed: {' '.join(result['error'])}")
+            continue
+        print(f"{result['mode']:<12} best {result['best_s'] * 1000:8.1f} ms   median {result['median_s'] * 1000:8.1f} ms")
+        for item in result['top_imports']:
+            print(f"    {item['cumulative_ms']:8.1f} ms  {item['module']}")
+
+
+if __name__ == '__main__':
+    main()
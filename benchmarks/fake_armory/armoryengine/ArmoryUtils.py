@@ -0,0 +1,2 @@
+NEW_BLOCK_ACTION = 'newBlock'
+NEW_ZC_ACTION = 'newZC'
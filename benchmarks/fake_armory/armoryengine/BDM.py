@@ -0,0 +1,38 @@
+import os
+import threading
+
+from armoryengine.ArmoryUtils import NEW_BLOCK_ACTION
+
+TheBDM = None
+
+
+class BDM:
+    """Block data manager that mines a fake block every FAKE_ARMORY_BLOCK_INTERVAL seconds"""
+
+    def __init__(self):
+        global TheBDM
+        self.height = 800000
+        self.callbacks = []
+        self.stopped = threading.Event()
+        self.thread = None
+        TheBDM = self
+
+    def start(self):
+        interval = float(os.getenv('FAKE_ARMORY_BLOCK_INTERVAL', '600'))
+        self.thread = threading.Thread(target=self._mine, args=(interval,), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def _mine(self, interval):
+        while not self.stopped.wait(interval):
+            self.height += 1
+            for callback in list(self.callbacks):
+                callback(NEW_BLOCK_ACTION, [self.height])
+
+    def registerCppNotification(self, callback):
+        self.callbacks.append(callback)
+
+    def getTopBlockHeight(self):
+        return self.height
@@ -0,0 +1,56 @@
+import os
+import random
+import threading
+
+from armoryengine import delay
+from armoryengine.Transaction import FakeTx
+
+
+class PyBtcWallet:
+    """In-memory wallet with a synthetic transaction history"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.transactions = []
+        self.path = None
+
+    def createNewWallet(self, wallet_path=None, passphrase=None, network='mainnet'):
+        delay('FAKE_ARMORY_CREATE_MS', 500)
+        if wallet_path:
+            open(wallet_path, 'w').close()
+        self._generate(wallet_path)
+
+    def readWalletFile(self, wallet_path):
+        delay('FAKE_ARMORY_LATENCY_MS', 2)
+        self._generate(wallet_path)
+
+    def _generate(self, wallet_path):
+        # The history is derived from the path, so a reloaded wallet looks the same
+        self.path = wallet_path
+        rng = random.Random(wallet_path)
+        count = int(os.getenv('FAKE_ARMORY_HISTORY', '1000'))
+        self.transactions = [FakeTx(i, rng.randint(-50000, 100000), 700000 + i // 10) for i in range(count)]
+
+    def getBalance(self, kind='total'):
+        delay('FAKE_ARMORY_LATENCY_MS', 2)
+        with self.lock:
+            confirmed = sum(tx.value for tx in self.transactions if tx.height >= 0)
+            unconfirmed = sum(tx.value for tx in self.transactions if tx.height < 0)
+        return {'confirmed': confirmed, 'unconfirmed': unconfirmed}.get(kind, confirmed + unconfirmed)
+
+    def getTransactions(self, count=10):
+        delay('FAKE_ARMORY_LATENCY_MS', 2)
+        with self.lock:
+            return list(reversed(self.transactions[-count:]))
+
+    def createTx(self, to_address=None, amount=None, feeRate=None, recipValuePairs=None):
+        delay('FAKE_ARMORY_LATENCY_MS', 2)
+        if recipValuePairs is not None:
+            amount = sum(value for _, value in recipValuePairs)
+        with self.lock:
+            return FakeTx(len(self.transactions), -int(amount), -1)
+
+    def broadcastTransaction(self, tx):
+        delay('FAKE_ARMORY_LATENCY_MS', 2)
+        with self.lock:
+            self.transactions.append(tx)
@@ -0,0 +1,26 @@
+import hashlib
+import time
+
+
+class FakeTx:
+    def __init__(self, index, value, height, timestamp=None):
+        self.index = index
+        self.value = value
+        self.height = height
+        self.timestamp = timestamp or int(time.time())
+
+    def getHash(self):
+        return hashlib.sha256(f"{self.index}:{self.value}:{self.height}".encode()).hexdigest()
+
+    def getValue(self):
+        return self.value
+
+    def getTimestamp(self):
+        return self.timestamp
+
+    def getBlockHeight(self):
+        return self.height
+
+    def getConfirmations(self):
+        from armoryengine.BDM import TheBDM
+        return max(0, TheBDM.getTopBlockHeight() - self.height + 1) if self.height >= 0 else 0
@@ -0,0 +1,18 @@
+"""Fake armoryengine for offline benchmarks.
+
+Put ``benchmarks/fake_armory`` first on PYTHONPATH and
+BitcoinArmoryManager will load these modules instead of the real
+BitcoinArmory submodule. Latencies are controlled by environment
+variables:
+
+    FAKE_ARMORY_LATENCY_MS         per wallet call (default 2)
+    FAKE_ARMORY_CREATE_MS          wallet creation (default 500)
+    FAKE_ARMORY_BLOCK_INTERVAL     seconds between fake blocks (default 600)
+    FAKE_ARMORY_HISTORY            transactions in a new wallet (default 1000)
+"""
+import os
+import time
+
+
+def delay(name, default_ms):
+    time.sleep(float(os.getenv(name, default_ms)) / 1000)
@@ -0,0 +1,374 @@
+"""Offline load test for the KairoAI API.
+
+Starts the stub LLM (benchmarks/stub_llm.py) and, unless --url is given,
+a gunicorn server with the fake armoryengine (benchmarks/fake_armory)
+first on PYTHONPATH. It then drives a weighted mix of routes at a fixed
+concurrency and writes a JSON report with throughput, p50/p95/p99
+latency per route and server RSS growth. Pass --compare with an older
+report to print the differences. Failed requests are counted per route
+and per status code.
+
+Bitcoin requests name the benchmark wallet explicitly (wallet=loadtest),
+so every gunicorn worker loads it from disk rather than relying on
+whichever worker handled the create call.
+
+Each load thread sends its own X-Client-ID so the per-client rate limit
+(429) sees many clients. The server only honours it from addresses in
+KAIRO_TRUSTED_PROXIES, which the harness sets to 127.0.0.1 for the
+server it starts; a server given with --url needs the same setting (or a
+KAIRO_CLIENT_RATE high enough for the whole run). This does nothing for
+admission control: requests beyond KAIRO_MAX_INFLIGHT plus
+KAIRO_ADMISSION_QUEUE in a worker are still shed with 503, and the
+server's defaults (half and a quarter of KAIRO_THREADS) shed about a
+quarter of the requests when --concurrency equals --threads. The harness
+therefore sets KAIRO_MAX_INFLIGHT to --concurrency for the server it
+starts, unless either variable is already in the environment; a server
+given with --url needs the same.
+
+    python benchmarks/loadtest.py --concurrency 32 --duration 60 --output report.json
+    python benchmarks/loadtest.py --compare report.json --output new.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import psutil
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import stub_llm
+
+DEFAULT_MIX = {
+    'respond': 30,
+    'respond_stream': 10,
+    'memory': 15,
+    'health': 15,
+    'status': 10,
+    'bitcoin_balance': 10,
+    'bitcoin_transactions': 8,
+    'bitcoin_send': 2
+}
+
+WALLET = 'loadtest'
+
+
+class Client:
+    """Keep-alive HTTP client, one per load thread
+
+    Each load thread sends its own X-Client-ID so the server's per-client
+    rate limit sees many clients rather than one very busy one. It has no
+    effect on admission control (see the module docstring).
+    """
+
+    def __init__(self, base_url, timeout=120, client_id=None):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.client_id = client_id
+        self.conn = None
+
+    def request(self, method, path, payload=None):
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body else {}
+        if self.client_id:
+            headers['X-Client-ID'] = self.client_id
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                return response.status, data
+            except (http.client.HTTPException, ConnectionError):
+                # The server may close idle keep-alive connections; retry once
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+
+def build_requests(prompt_pool):
+    prompts = [f"benchmark prompt number {i}" for i in range(prompt_pool)]
+    return {
+        'respond': lambda: ('POST', '/api/respond', {'input': random.choice(prompts)}),
+        'respond_stream': lambda: ('POST', '/api/respond/stream', {'input': random.choice(prompts)}),
+        'memory': lambda: ('GET', '/api/memory?count=50', None),
+        'health': lambda: ('GET', '/health', None),
+        'status': lambda: ('GET', '/status', None),
+        'bitcoin_balance': lambda: ('GET', f'/bitcoin/wallet/balance?wallet={WALLET}', None),
+        'bitcoin_transactions': lambda: ('GET', f'/bitcoin/transactions?count=25&wallet={WALLET}', None),
+        'bitcoin_send': lambda: ('POST', '/bitcoin/transaction/send', {
+            'to_address': 'bc1qbenchmark', 'amount': random.randint(1000, 5000), 'wait': 5, 'wallet': WALLET
+        })
+    }
+
+
+def rss_bytes(pid):
+    """RSS of a process and all of its children (gunicorn master + workers)"""
+    try:
+        proc = psutil.Process(pid)
+        return sum(p.memory_info().rss for p in [proc] + proc.children(recursive=True))
+    except psutil.Error:
+        return 0
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def start_server(args, scratch, llm_url):
+    port = args.port
+    env = dict(
+        os.environ,
+        HOME=scratch,
+        PYTHONPATH=os.pathsep.join([str(ROOT / 'benchmarks' / 'fake_armory'), str(ROOT)]),
+        OPENAI_API_KEY='stub',
+        OPENAI_BASE_URL=llm_url,
+        KAIRO_BIND=f"127.0.0.1:{port}",
+        KAIRO_WORKERS=str(args.workers),
+        KAIRO_THREADS=str(args.threads),
+        KAIRO_TRUSTED_PROXIES='127.0.0.1',
+        KAIRO_MEMORY_DIR=os.path.join(scratch, 'memory'),
+        KAIRO_CACHE_DIR=os.path.join(scratch, 'cache'),
+        PROMETHEUS_MULTIPROC_DIR=os.path.join(scratch, 'metrics')
+    )
+    if args.no_cache:
+        env['KAIRO_RESPONSE_CACHE'] = '0'
+    if 'KAIRO_MAX_INFLIGHT' not in os.environ and 'KAIRO_ADMISSION_QUEUE' not in os.environ:
+        # One worker may receive every in-flight request of the run
+        env['KAIRO_MAX_INFLIGHT'] = str(args.concurrency)
+        env['KAIRO_ADMISSION_QUEUE'] = '0'
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'api_interface:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL if not args.verbose else None,
+        stderr=subprocess.DEVNULL if not args.verbose else None
+    )
+    return proc, f"http://127.0.0.1:{port}"
+
+
+def wait_until_up(url, proc=None, timeout=60):
+    # /health reports an error until a wallet exists, so wait on /metrics instead
+    client = Client(url, timeout=5)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"server exited with status {proc.returncode}")
+        try:
+            status, _ = client.request('GET', '/metrics')
+            if status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"server at {url} did not come up within {timeout}s")
+
+
+def prepare_wallet(url, timeout=60):
+    """Create the benchmark wallet and wait until balance reads succeed"""
+    client = Client(url)
+    client.request('POST', '/bitcoin/wallet/create', {'name': WALLET, 'password': WALLET})
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status, _ = client.request('GET', f'/bitcoin/wallet/balance?wallet={WALLET}')
+        if status == 200:
+            return True
+        time.sleep(0.25)
+    return False
+
+
+def run_load(url, mix, requests, concurrency, duration):
+    routes = list(mix)
+    weights = [mix[route] for route in routes]
+    samples = {route: [] for route in routes}
+    errors = {route: Counter() for route in routes}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(n):
+        client = Client(url, client_id=f"loadtest-{n}")
+        local = []
+        while time.monotonic() < deadline:
+            route = random.choices(routes, weights)[0]
+            method, path, payload = requests[route]()
+            start = time.perf_counter()
+            try:
+                status, _ = client.request(method, path, payload)
+            except OSError:
+                status = 599
+            local.append((route, time.perf_counter() - start, status))
+        with lock:
+            for route, elapsed, status in local:
+                samples[route].append(elapsed)
+                if status >= 400:
+                    errors[route][status] += 1
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, errors, time.perf_counter() - started
+
+
+def summarize(samples, errors, elapsed):
+    routes = {}
+    for route, latencies in samples.items():
+        latencies.sort()
+        routes[route] = {
+            'count': len(latencies),
+            'errors': sum(errors[route].values()),
+            'error_statuses': {str(status): count for status, count in sorted(errors[route].items())},
+            'rps': round(len(latencies) / elapsed, 2),
+            'p50_ms': _ms(percentile(latencies, 50)),
+            'p95_ms': _ms(percentile(latencies, 95)),
+            'p99_ms': _ms(percentile(latencies, 99))
+        }
+    total = sum(route['count'] for route in routes.values())
+    return total, routes
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old, new):
+    """Print per-route deltas between two reports"""
+    print(f"throughput: {old['throughput_rps']} -> {new['throughput_rps']} req/s")
+    print(f"rss growth: {old['rss']['growth_mb']} -> {new['rss']['growth_mb']} MB")
+    print(f"{'route':<22} {'p50_ms':>18} {'p95_ms':>18} {'p99_ms':>18}")
+    for route, stats in new['routes'].items():
+        before = old['routes'].get(route)
+        if not before:
+            continue
+        cells = [f"{before[key]} -> {stats[key]}" for key in ('p50_ms', 'p95_ms', 'p99_ms')]
+        print(f"{route:<22} {cells[0]:>18} {cells[1]:>18} {cells[2]:>18}")
+
+
+def parse_mix(items):
+    mix = dict(DEFAULT_MIX)
+    for item in items or []:
+        route, _, weight = item.partition('=')
+        if route not in DEFAULT_MIX:
+            raise SystemExit(f"unknown route in --mix: {route}")
+        mix[route] = float(weight)
+    return {route: weight for route, weight in mix.items() if weight > 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='drive an already running server instead of starting one')
+    parser.add_argument('--server-pid', type=int, help='PID to measure RSS for when using --url')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--warmup', type=float, default=5)
+    parser.add_argument('--mix', nargs='*', metavar='ROUTE=WEIGHT', help='override route weights')
+    parser.add_argument('--prompt-pool', type=int, default=200, help='distinct prompts sent to /api/respond')
+    parser.add_argument('--no-cache', action='store_true', help='disable the response cache on the server')
+    parser.add_argument('--llm-latency-ms', type=float, default=200)
+    parser.add_argument('--llm-tokens-per-second', type=float, default=50)
+    parser.add_argument('--llm-error-rate', type=float, default=0.0)
+    parser.add_argument('--output', help='write the JSON report here')
+    parser.add_argument('--compare', help='earlier JSON report to compare against')
+    parser.add_argument('--verbose', action='store_true', help='show server output')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    llm = stub_llm.serve(latency=args.llm_latency_ms / 1000, tokens_per_second=args.llm_tokens_per_second,
+                         error_rate=args.llm_error_rate)
+    llm_url = f"http://127.0.0.1:{llm.server_address[1]}/v1"
+
+    scratch = tempfile.mkdtemp(prefix='kairo-loadtest-')
+    server = None
+    try:
+        if args.url:
+            url, pid = args.url, args.server_pid
+        else:
+            server, url = start_server(args, scratch, llm_url)
+            pid = server.pid
+        wait_until_up(url, server)
+        # /health includes the BitcoinArmory check, which fails until a wallet exists
+        needs_wallet = 'health' in mix or any(route.startswith('bitcoin') for route in mix)
+        wallet_ready = prepare_wallet(url) if needs_wallet else None
+
+        requests = build_requests(args.prompt_pool)
+        if args.warmup:
+            run_load(url, mix, requests, args.concurrency, args.warmup)
+        rss_start = rss_bytes(pid) if pid else 0
+        samples, errors, elapsed = run_load(url, mix, requests, args.concurrency, args.duration)
+        rss_end = rss_bytes(pid) if pid else 0
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        llm.shutdown()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    total, routes = summarize(samples, errors, elapsed)
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'workers': args.workers,
+            'threads': args.threads,
+            'mix': mix,
+            'prompt_pool': args.prompt_pool,
+            'response_cache': not args.no_cache,
+            'llm_latency_ms': args.llm_latency_ms,
+            'llm_tokens_per_second': args.llm_tokens_per_second,
+            'llm_error_rate': args.llm_error_rate
+        },
+        'wallet_ready': wallet_ready,
+        'elapsed_s': round(elapsed, 3),
+        'total_requests': total,
+        'throughput_rps': round(total / elapsed, 2),
+        'routes': routes,
+        'rss': {
+            'start_mb': round(rss_start / 2 ** 20, 1),
+            'end_mb': round(rss_end / 2 ** 20, 1),
+            'growth_mb': round((rss_end - rss_start) / 2 ** 20, 1)
+        }
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Local stand-in for the OpenAI chat completions endpoint.
+
+Serves POST /v1/chat/completions with configurable time-to-first-token
+and token rate, both plain and streamed (SSE). A fraction of requests can
+be failed (--error-rate) or slowed down (--slow-rate, --slow-ms) to test
+fallback and hedging. Point NLPProcessor at it with
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1, or list several stubs in
+KAIRO_LLM_BACKENDS.
+
+    python benchmarks/stub_llm.py --port 8765 --latency-ms 300 --tokens-per-second 40
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Set by serve()
+    latency = 0.2
+    tokens_per_second = 50.0
+    response_tokens = 30
+    error_rate = 0.0
+    slow_rate = 0.0
+    slow_latency = 2.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'not found'}})
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if self.error_rate and random.random() < self.error_rate:
+            self._send_json(500, {'error': {'message': 'injected failure', 'type': 'server_error'}})
+            return
+
+        prompt = body.get('messages', [{}])[-1].get('content', '')
+        tokens = [f"tok{i} " for i in range(self.response_tokens - 1)] + [f"[{len(prompt)}]"]
+        slow = self.slow_rate and random.random() < self.slow_rate
+        time.sleep(self.slow_latency if slow else self.latency)
+        if body.get('stream'):
+            self._stream(body.get('model', 'stub'), tokens)
+        else:
+            time.sleep(len(tokens) / self.tokens_per_second)
+            self._send_json(200, {
+                'id': 'chatcmpl-stub',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body.get('model', 'stub'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                    'finish_reason': 'stop'
+                }],
+                'usage': {'prompt_tokens': len(prompt.split()), 'completion_tokens': len(tokens),
+                          'total_tokens': len(prompt.split()) + len(tokens)}
+            })
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chunk(self, data):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def _stream(self, model, tokens):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        delay = 1.0 / self.tokens_per_second
+        for token in tokens:
+            chunk = {
+                'id': 'chatcmpl-stub',
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}]
+            }
+            self._chunk(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            time.sleep(delay)
+        self._chunk(b'data: [DONE]\n\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hang up on purpose (cancelled hedges, closed streams)
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def serve(host='127.0.0.1', port=0, latency=0.2, tokens_per_second=50.0, response_tokens=30, error_rate=0.0,
+          slow_rate=0.0, slow_latency=2.0):
+    """Start the stub in a background thread; returns the server (see server_address)"""
+    handler = type('ConfiguredStubLLMHandler', (StubLLMHandler,), {
+        'latency': latency,
+        'tokens_per_second': tokens_per_second,
+        'response_tokens': response_tokens,
+        'error_rate': error_rate,
+        'slow_rate': slow_rate,
+        'slow_latency': slow_latency
+    })
+    server = StubLLMServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name='stub-llm', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=200, help='time to first token')
+    parser.add_argument('--tokens-per-second', type=float, default=50)
+    parser.add_argument('--response-tokens', type=int, default=30)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with HTTP 500')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='fraction of requests delayed by --slow-ms')
+    parser.add_argument('--slow-ms', type=float, default=2000, help='time to first token of a slow request')
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.latency_ms / 1000, args.tokens_per_second,
+                   args.response_tokens, args.error_rate, args.slow_rate, args.slow_ms / 1000)
+    print(f"Stub LLM listening on http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,423 @@
 import os
+import re
 import sys
 import logging
 from pathlib import Path
 import json
 from datetime import datetime
 import threading
+import time
 import queue
+import itertools
+import importlib
+import uuid
+from types import SimpleNamespace
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError, wait as wait_futures
+
+from flask import request, jsonify
+
+import metrics
+import tracing
+from transaction_index import TransactionIndex
+from wallet_backup import BackupEngine
 
-# Add BitcoinArmory to Python path
 armory_path = Path(__file__).parent / "BitcoinArmory"
-sys.path.append(str(armory_path))
-
-# Import BitcoinArmory components
-try:
-    from armoryengine.ArmoryUtils import *
-    from armoryengine.Block import *
-    from armoryengine.BDM import *
-    from armoryengine.Wallet import *
-    from armoryengine.PyBtcWallet import *
-    from armoryengine.Transaction import *
-except ImportError as e:
-    logging.error(f"Failed to import BitcoinArmory components: {e}")
-    raise
+ARMORY_MODULES = ['ArmoryUtils', 'Block', 'BDM', 'Wallet', 'PyBtcWallet', 'Transaction']
+
+_armory = None
+_armory_lock = threading.Lock()
+
+# Wallet names become file names, so they are kept to a safe alphabet
+WALLET_NAME = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+class InvalidWalletName(ValueError):
+    """Raised for a wallet name that is not allowed in a file name"""
+
+def check_wallet_name(name):
+    if not isinstance(name, str) or not WALLET_NAME.match(name):
+        raise InvalidWalletName(f"Invalid wallet name: {name!r} (use 1-64 letters, digits, '_' or '-')")
+    return name
+
+def load_armory():
+    """Import the BitcoinArmory components on first use
+    
+    armoryengine is slow to import, so it is only loaded once a manager
+    starts or runs an operation (or in the gunicorn master when
+    preloading, so workers share it copy-on-write). Returns a namespace
+    with the public names of every armoryengine module we use.
+    """
+    global _armory
+    with _armory_lock:
+        if _armory is None:
+            if str(armory_path) not in sys.path:
+                sys.path.append(str(armory_path))
+            names = {}
+            try:
+                for module_name in ARMORY_MODULES:
+                    module = importlib.import_module(f"armoryengine.{module_name}")
+                    public = getattr(module, '__all__', None) or [n for n in vars(module) if not n.startswith('_')]
+                    names.update((name, getattr(module, name)) for name in public)
+            except ImportError as e:
+                logging.error(f"Failed to import BitcoinArmory components: {e}")
+                raise
+            _armory = SimpleNamespace(**names)
+        return _armory
+
+# Operations that only read wallet state; everything else is serialized
+READ_OPERATIONS = {'get_balance', 'sync_transactions'}
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+_STOP = object()
+
+# BDM notification actions that change wallet state, unless armoryengine names them
+NEW_BLOCK_ACTION = 'newBlock'
+NEW_ZC_ACTION = 'newZC'
+
+class WalletStateCache:
+    """Wallet reads computed once per chain state
+    
+    Keys are ``(kind, wallet name)`` tuples. Cached values are tagged
+    with (version, wallet version, tip height). The version is bumped by
+    BDM new-block / new-zero-conf notifications, a wallet's own version
+    by local changes to that wallet, and the tip height is a cheap
+    fallback check. Without notifications, ``max_age`` bounds how long a
+    zero-conf change can go unseen.
+    """
+    
+    def __init__(self, tip_height=None, max_age=30):
+        self.tip_height = tip_height
+        self.max_age = max_age
+        self.notifications = False
+        self.version = 0
+        self.wallet_versions = {}
+        self.entries = {}
+        self.lock = threading.Lock()
+    
+    def state(self, wallet=None):
+        tip = None
+        if self.tip_height:
+            try:
+                tip = self.tip_height()
+            except Exception:
+                tip = None
+        return (self.version, self.wallet_versions.get(wallet, 0), tip)
+    
+    def invalidate(self, wallet=None):
+        """Drop cached values for one wallet, or for all wallets"""
+        with self.lock:
+            if wallet is None:
+                self.version += 1
+                self.entries.clear()
+                return
+            self.wallet_versions[wallet] = self.wallet_versions.get(wallet, 0) + 1
+            for key in [key for key in self.entries if key[1] == wallet]:
+                del self.entries[key]
+    
+    def get(self, key):
+        """Return the cached value for key, or None if stale or missing"""
+        state = self.state(key[1])
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None or entry[0] != state:
+            return None
+        if not self.notifications and time.monotonic() - entry[1] > self.max_age:
+            return None
+        return entry[2]
+    
+    def put(self, key, value, state):
+        with self.lock:
+            # A notification or wallet change may have arrived while value was being computed
+            if state[:2] == (self.version, self.wallet_versions.get(key[1], 0)):
+                self.entries[key] = (state, time.monotonic(), value)
+    
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            state = self.state(key[1])
+            value = compute()
+            self.put(key, value, state)
+        return value
+
+class OperationExecutor:
+    """Prioritized worker pool for BitcoinArmory operations
+    
+    Read-only operations run on ``read_workers`` threads and
+    wallet-mutating operations on a single writer thread, so a slow
+    wallet creation never delays a balance read. Each lane is a priority
+    queue. submit() returns an operation id plus a Future; finished
+    operations stay pollable while fewer than ``history`` are tracked.
+    """
+    
+    def __init__(self, handler, read_workers=4, history=1000):
+        self.logger = logging.getLogger('KairoAI.BitcoinArmory')
+        self.handler = handler
+        self.read_workers = read_workers
+        self.history = history
+        self.lanes = {'read': queue.PriorityQueue(), 'write': queue.PriorityQueue()}
+        self.operations = OrderedDict()
+        self.lock = threading.Lock()
+        self.counter = itertools.count()
+        self.threads = []
+        self.running = 0  # operations being handled right now
+        self.is_running = False
+    
+    def start(self):
+        if self.is_running:
+            return
+        self.is_running = True
+        lanes = [('write', 1), ('read', self.read_workers)]
+        for lane, count in lanes:
+            for i in range(count):
+                thread = threading.Thread(target=self._worker, args=(lane,), name=f"armory-{lane}-{i}")
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+    
+    def stop(self):
+        """Stop workers immediately, cancelling operations still queued"""
+        if not self.is_running:
+            return
+        self.is_running = False
+        for lane, work in self.lanes.items():
+            # Sentinels sort ahead of all real work, so idle and busy workers exit promptly
+            for _ in self.threads:
+                work.put((-1, next(self.counter), _STOP))
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        for work in self.lanes.values():
+            while True:
+                try:
+                    _, _, op = work.get_nowait()
+                except queue.Empty:
+                    break
+                if op is not _STOP:
+                    metrics.BITCOIN_QUEUE_DEPTH.dec()
+                    self._finish(op, error=RuntimeError("BitcoinArmory manager stopped"), status='cancelled')
+    
+    def busy(self):
+        """Whether any operation is running or waiting in a lane"""
+        return self.running > 0 or any(not work.empty() for work in self.lanes.values())
+    
+    def drain(self, timeout=None):
+        """Wait for queued and running operations to finish; returns False on timeout"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            with self.lock:
+                pending = [op['future'] for op in self.operations.values() if 'finished_at' not in op]
+            if not pending:
+                return True
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                return False
+            wait_futures(pending, timeout=remaining)
+    
+    def submit(self, op_type, params, priority=None):
+        """Queue an operation and return (operation id, Future)"""
+        if not self.is_running:
+            raise RuntimeError("BitcoinArmory manager is not running")
+        lane = 'read' if op_type in READ_OPERATIONS else 'write'
+        if priority is None:
+            priority = PRIORITY_HIGH if lane == 'read' else PRIORITY_NORMAL
+        op = {
+            'id': uuid.uuid4().hex,
+            'type': op_type,
+            'params': params,
+            'status': 'queued',
+            'submitted_at': datetime.now().isoformat(),
+            'future': Future(),
+            # Links the operation's spans to the submitting request
+            'trace': (*tracing.current(), time.perf_counter())
+        }
+        with self.lock:
+            self.operations[op['id']] = op
+        metrics.BITCOIN_QUEUE_DEPTH.inc()
+        self.lanes[lane].put((priority, next(self.counter), op))
+        return op['id'], op['future']
+    
+    def status(self, op_id):
+        """Return a JSON-friendly view of an operation, or None if unknown"""
+        with self.lock:
+            op = self.operations.get(op_id)
+            if op is None:
+                return None
+            return {key: value for key, value in op.items() if key not in ('future', 'params', 'trace')}
+    
+    def _worker(self, lane):
+        work = self.lanes[lane]
+        while True:
+            _, _, op = work.get()
+            if op is _STOP:
+                return
+            metrics.BITCOIN_QUEUE_DEPTH.dec()
+            if not op['future'].set_running_or_notify_cancel():
+                self._finish(op, status='cancelled')
+                continue
+            op['status'] = 'running'
+            trace_id, parent, submitted = op['trace']
+            tracing.record('armory_queue_wait', time.time() - (time.perf_counter() - submitted),
+                           time.perf_counter() - submitted, trace_id, parent, operation=op['type'], lane=lane)
+            with self.lock:
+                self.running += 1
+            try:
+                with tracing.span(f"armory.{op['type']}", trace_id=trace_id, parent=parent):
+                    result = self.handler(op)
+            except Exception as e:
+                self._finish(op, error=e)
+            else:
+                self._finish(op, result=result)
+            finally:
+                with self.lock:
+                    self.running -= 1
+    
+    def _finish(self, op, result=None, error=None, status=None):
+        with self.lock:
+            op['status'] = status or ('failed' if error else 'completed')
+            op['finished_at'] = datetime.now().isoformat()
+            if error is not None:
+                op['error'] = str(error)
+            else:
+                op['result'] = result
+            self._prune()
+        future = op['future']
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    
+    def _prune(self):
+        # Operations are kept in submission order; drop the oldest finished ones
+        while len(self.operations) > self.history:
+            op = next(iter(self.operations.values()))
+            if 'finished_at' not in op:
+                break
+            self.operations.popitem(last=False)
+
+class WalletRegistry:
+    """Loaded wallets by name, loaded on first use and unloaded when idle
+    
+    At most ``max_loaded`` wallets stay in memory; the least recently
+    used one is unloaded to make room, as is any wallet unused for
+    ``idle_timeout`` seconds. ``loader(name)`` returns a (wallet,
+    transaction index) pair and ``unloader`` releases one. A wallet taken
+    with acquire() is only unloaded once every holder has released it.
+    """
+    
+    def __init__(self, loader, max_loaded=32, idle_timeout=None, unloader=None):
+        self.loader = loader
+        self.unloader = unloader
+        self.max_loaded = max_loaded
+        self.idle_timeout = idle_timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.load_locks = {}
+        self.holders = {}  # id(transaction index) -> number of acquire() calls not yet released
+        self.retired = {}  # id(transaction index) -> (name, entry) evicted while held
+    
+    def get(self, name):
+        """Return the (wallet, transaction index) entry for name, loading it if needed"""
+        return self._get(name, hold=False)
+    
+    def acquire(self, name):
+        """Like get(), but the entry stays loaded until release() is called with it"""
+        return self._get(name, hold=True)
+    
+    def release(self, entry):
+        """Give back an entry from acquire(), unloading it if it was evicted meanwhile"""
+        key = id(entry[1])
+        with self.lock:
+            self.holders[key] -= 1
+            if self.holders[key]:
+                return
+            del self.holders[key]
+            retired = self.retired.pop(key, None)
+        if retired is not None:
+            self._unload([retired])
+    
+    def _get(self, name, hold):
+        with self.lock:
+            entry = self._touch(name, hold)
+            if entry is not None:
+                return entry
+            load_lock = self.load_locks.setdefault(name, threading.Lock())
+        # Load outside the registry lock so a slow wallet file doesn't block other wallets
+        with load_lock:
+            with self.lock:
+                entry = self._touch(name, hold)
+            if entry is None:
+                entry = self.loader(name)
+                self.add(name, *entry, hold=hold)
+            return entry
+    
+    def add(self, name, wallet, tx_index, hold=False):
+        with self.lock:
+            previous = self.entries.pop(name, None)
+            self.entries[name] = (wallet, tx_index, time.monotonic())
+            if hold:
+                self.holders[id(tx_index)] = self.holders.get(id(tx_index), 0) + 1
+            evicted = self._evict()
+            self.load_locks.pop(name, None)
+            if previous is not None and previous[1] is not tx_index:
+                evicted.append((name, previous))
+            evicted = self._retire(evicted)
+        self._unload(evicted)
+    
+    def _retire(self, evicted):
+        """Hold back evicted entries that are still in use; returns the rest (call with the lock)"""
+        free = []
+        for name, entry in evicted:
+            if id(entry[1]) in self.holders:
+                self.retired[id(entry[1])] = (name, entry)
+            else:
+                free.append((name, entry))
+        return free
+    
+    def _touch(self, name, hold=False):
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+        self.entries[name] = (entry[0], entry[1], time.monotonic())
+        self.entries.move_to_end(name)
+        if hold:
+            self.holders[id(entry[1])] = self.holders.get(id(entry[1]), 0) + 1
+        return entry[:2]
+    
+    def _evict(self):
+        evicted = []
+        now = time.monotonic()
+        while self.entries:
+            name, entry = next(iter(self.entries.items()))
+            idle = self.idle_timeout is not None and now - entry[2] > self.idle_timeout
+            if len(self.entries) <= self.max_loaded and not idle:
+                break
+            self.entries.popitem(last=False)
+            evicted.append((name, entry))
+        return evicted
+    
+    def _unload(self, evicted):
+        for name, entry in evicted:
+            if self.unloader:
+                self.unloader(name, entry[0], entry[1])
+    
+    def loaded(self):
+        with self.lock:
+            evicted = self._retire(self._evict())
+            names = list(self.entries)
+        self._unload(evicted)
+        return names
+    
+    def clear(self):
+        with self.lock:
+            evicted = self._retire(list(self.entries.items()))
+            self.entries.clear()
+        self._unload(evicted)
 
 class BitcoinArmoryManager:
     def __init__(self, config_path=None):
@@ -31,19 +427,105 @@ class BitcoinArmoryManager:
         
         # Initialize BitcoinArmory components
         self.bdm = None
-        self.wallet = None
-        self.operation_queue = queue.Queue()
         self.is_running = False
-        self.thread = None
         
         # Load configuration
+        self._config_mtime = None
         self.config = self._load_config()
         
+        self.executor = OperationExecutor(
+            self._process_operation,
+            read_workers=self.config.get('read_workers', 4)
+        )
+        self.wallet_cache = WalletStateCache(
+            tip_height=self._tip_height,
+            max_age=self.config.get('wallet_cache_ttl', 30)
+        )
+        self.wallets = WalletRegistry(
+            self._load_wallet,
+            max_loaded=self.config.get('max_loaded_wallets', 32),
+            idle_timeout=self.config.get('wallet_idle_timeout'),
+            unloader=self._unload_wallet
+        )
+        # Backups yield to queued wallet operations and throttle their own I/O
+        self.backups = BackupEngine.from_config(self.config, self.config_path, busy=self.executor.busy)
+    
+    @property
+    def default_wallet(self):
+        """The most recently created wallet, shared by every worker through the config file"""
+        config_file = self.config_path / 'config.json'
+        try:
+            mtime = config_file.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime is not None and mtime != self._config_mtime:
+            # Another worker may have created a wallet since
+            try:
+                with open(config_file, 'r') as f:
+                    self.config['default_wallet'] = json.load(f).get('default_wallet')
+                self._config_mtime = mtime
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Could not re-read config: {e}")
+        return self.config.get('default_wallet')
+    
+    @default_wallet.setter
+    def default_wallet(self, name):
+        self.config['default_wallet'] = name
+        self._save_config()
+    
+    @property
+    def wallet(self):
+        """The default wallet (the most recently created), or None"""
+        if self.default_wallet is None:
+            return None
+        return self.wallets.get(self.default_wallet)[0]
+    
+    def _wallet_path(self, name):
+        return Path(self.config['wallet_path']) / f"{check_wallet_name(name)}.wallet"
+    
+    def _load_wallet(self, name):
+        """Read a wallet file from wallet_path; returns (wallet, transaction index)"""
+        path = self._wallet_path(name)
+        if not path.exists():
+            raise ValueError(f"Unknown wallet: {name}")
+        wallet = load_armory().PyBtcWallet()
+        wallet.readWalletFile(str(path))
+        self.logger.info(f"Loaded wallet: {name}")
+        return wallet, self._open_tx_index(name)
+    
+    def _unload_wallet(self, name, wallet, tx_index):
+        tx_index.close()
+        self.wallet_cache.invalidate(name)
+        self.logger.info(f"Unloaded wallet: {name}")
+    
+    @contextmanager
+    def _using(self, name):
+        """Yield (name, wallet, transaction index) for name or the default wallet
+        
+        The wallet is not unloaded (nor its index closed) until the block ends.
+        """
+        name = name or self.default_wallet
+        if name is None:
+            raise ValueError("No wallet loaded")
+        entry = self.wallets.acquire(check_wallet_name(name))
+        try:
+            yield name, entry[0], entry[1]
+        finally:
+            self.wallets.release(entry)
+    
+    def list_wallets(self):
+        """Names of all wallets on disk and of those currently loaded"""
+        wallet_dir = Path(self.config['wallet_path'])
+        on_disk = sorted(path.stem for path in wallet_dir.glob('*.wallet')) if wallet_dir.exists() else []
+        return {'wallets': on_disk, 'loaded': self.wallets.loaded(), 'default': self.default_wallet}
+    
     def _load_config(self):
         config_file = self.config_path / 'config.json'
         if config_file.exists():
             with open(config_file, 'r') as f:
-                return json.load(f)
+                config = json.load(f)
+            self._config_mtime = config_file.stat().st_mtime_ns
+            return config
         return {
             'network': 'mainnet',
             'data_dir': str(self.config_path / 'data'),
@@ -53,9 +535,13 @@ class BitcoinArmoryManager:
         }
     
     def _save_config(self):
+        # Other workers read this file, so replace it in one step
         config_file = self.config_path / 'config.json'
-        with open(config_file, 'w') as f:
+        tmp = config_file.with_name(f"config.json.{os.getpid()}.tmp")
+        with open(tmp, 'w') as f:
             json.dump(self.config, f, indent=4)
+        os.replace(tmp, config_file)
+        self._config_mtime = config_file.stat().st_mtime_ns
     
     def start(self):
         """Start the BitcoinArmory manager"""
@@ -63,146 +549,247 @@ class BitcoinArmoryManager:
             return
             
         self.is_running = True
-        self.thread = threading.Thread(target=self._run_loop)
-        self.thread.daemon = True
-        self.thread.start()
+        self.executor.start()
         
         # Initialize BDM
         try:
-            self.bdm = BDM()
+            self.bdm = load_armory().BDM()
             self.bdm.start()
+            register = getattr(self.bdm, 'registerCppNotification', None)
+            if register:
+                register(self._on_bdm_notification)
+                self.wallet_cache.notifications = True
             self.logger.info("BitcoinArmory BDM started successfully")
         except Exception as e:
             self.logger.error(f"Failed to start BDM: {e}")
             raise
+        
+        if self.backups is not None:
+            self.backups.start()
     
-    def stop(self):
-        """Stop the BitcoinArmory manager"""
+    def stop(self, drain_timeout=None):
+        """Stop the BitcoinArmory manager
+        
+        With drain_timeout, queued operations (e.g. sends) get that many
+        seconds to finish before the rest are cancelled.
+        """
+        if drain_timeout and self.executor.is_running and not self.executor.drain(drain_timeout):
+            self.logger.warning("BitcoinArmory operations still queued at shutdown were cancelled")
         self.is_running = False
-        if self.thread:
-            self.thread.join()
+        if self.backups is not None:
+            self.backups.stop()
+        self.executor.stop()
+        self.wallets.clear()
         if self.bdm:
             self.bdm.stop()
         self.logger.info("BitcoinArmory manager stopped")
     
-    def _run_loop(self):
-        """Main processing loop for BitcoinArmory operations"""
-        while self.is_running:
-            try:
-                operation = self.operation_queue.get(timeout=1)
-                if operation:
-                    self._process_operation(operation)
-            except queue.Empty:
-                continue
-            except Exception as e:
-                self.logger.error(f"Error in BitcoinArmory processing loop: {e}")
+    def _tip_height(self):
+        top = getattr(self.bdm, 'getTopBlockHeight', None)
+        return top() if top else None
+    
+    def _on_bdm_notification(self, action, args=None):
+        armory = load_armory()
+        if action in (getattr(armory, 'NEW_BLOCK_ACTION', NEW_BLOCK_ACTION), getattr(armory, 'NEW_ZC_ACTION', NEW_ZC_ACTION)):
+            self.wallet_cache.invalidate()
+    
+    def submit(self, op_type, params, priority=None):
+        """Queue an operation; returns (operation id, Future)"""
+        return self.executor.submit(op_type, params, priority)
+    
+    def operation_status(self, op_id):
+        """Poll a submitted operation by id"""
+        return self.executor.status(op_id)
+    
+    def _call(self, op_type, params, timeout=None):
+        """Run an operation through the executor and wait for its result"""
+        if not self.executor.is_running:
+            return self._process_operation({'type': op_type, 'params': params})
+        _, future = self.submit(op_type, params)
+        return future.result(timeout)
     
     def _process_operation(self, operation):
         """Process a BitcoinArmory operation"""
         op_type = operation.get('type')
+        start = time.perf_counter()
+        status = 'ok'
         try:
             if op_type == 'create_wallet':
-                self._create_wallet(operation['params'])
+                return self._create_wallet(operation['params'])
             elif op_type == 'send_transaction':
-                self._send_transaction(operation['params'])
+                return self._send_transaction(operation['params'])
+            elif op_type == 'send_batch':
+                return self._send_batch(operation['params'])
             elif op_type == 'get_balance':
                 return self._get_balance(operation['params'])
-            elif op_type == 'get_transactions':
-                return self._get_transactions(operation['params'])
+            elif op_type == 'sync_transactions':
+                return self._sync_transactions(operation['params'])
             else:
-                self.logger.error(f"Unknown operation type: {op_type}")
+                status = 'unknown'
+                raise ValueError(f"Unknown operation type: {op_type}")
         except Exception as e:
+            status = 'error'
             self.logger.error(f"Error processing operation {op_type}: {e}")
             raise
+        finally:
+            metrics.observe_bitcoin_operation(op_type, status, time.perf_counter() - start)
     
     def create_wallet(self, name, password, network='mainnet'):
-        """Create a new Bitcoin wallet"""
-        self.operation_queue.put({
-            'type': 'create_wallet',
-            'params': {
-                'name': name,
-                'password': password,
-                'network': network
-            }
-        })
+        """Create a new Bitcoin wallet; returns the operation id"""
+        op_id, _ = self.submit('create_wallet', {
+            'name': check_wallet_name(name),
+            'password': password,
+            'network': network
+        }, priority=PRIORITY_LOW)
+        return op_id
     
     def _create_wallet(self, params):
         """Internal wallet creation method"""
         try:
-            wallet_path = Path(self.config['wallet_path']) / f"{params['name']}.wallet"
-            wallet = PyBtcWallet()
+            wallet_path = self._wallet_path(params['name'])
+            wallet_path.parent.mkdir(parents=True, exist_ok=True)
+            wallet = load_armory().PyBtcWallet()
             wallet.createNewWallet(
                 wallet_path=str(wallet_path),
                 passphrase=params['password'],
                 network=params['network']
             )
-            self.wallet = wallet
+            self.wallets.add(params['name'], wallet, self._open_tx_index(params['name']))
+            self.default_wallet = params['name']
+            self.wallet_cache.invalidate(params['name'])
             self.logger.info(f"Created new wallet: {params['name']}")
             return True
         except Exception as e:
             self.logger.error(f"Failed to create wallet: {e}")
             raise
     
-    def send_transaction(self, to_address, amount, fee_rate=None):
-        """Send a Bitcoin transaction"""
-        self.operation_queue.put({
-            'type': 'send_transaction',
-            'params': {
-                'to_address': to_address,
-                'amount': amount,
-                'fee_rate': fee_rate or self.config['max_fee_rate']
-            }
+    def send_transaction(self, to_address, amount, fee_rate=None, wallet=None):
+        """Send a Bitcoin transaction; returns (operation id, Future of tx hash)"""
+        return self.submit('send_transaction', {
+            'wallet': wallet or self.default_wallet,
+            'to_address': to_address,
+            'amount': amount,
+            'fee_rate': fee_rate or self.config['max_fee_rate']
         })
     
     def _send_transaction(self, params):
         """Internal transaction sending method"""
-        if not self.wallet:
-            raise ValueError("No wallet loaded")
-            
-        try:
-            tx = self.wallet.createTx(
-                params['to_address'],
-                params['amount'],
-                feeRate=params['fee_rate']
-            )
-            self.wallet.broadcastTransaction(tx)
-            self.logger.info(f"Transaction sent: {tx.getHash()}")
-            return tx.getHash()
-        except Exception as e:
-            self.logger.error(f"Failed to send transaction: {e}")
-            raise
+        with self._using(params.get('wallet')) as (name, wallet, _):
+            try:
+                tx = wallet.createTx(
+                    params['to_address'],
+                    params['amount'],
+                    feeRate=params['fee_rate']
+                )
+                wallet.broadcastTransaction(tx)
+                self.wallet_cache.invalidate(name)
+                self.logger.info(f"Transaction sent: {tx.getHash()}")
+                return tx.getHash()
+            except Exception as e:
+                self.logger.error(f"Failed to send transaction: {e}")
+                raise
     
-    def get_balance(self):
-        """Get wallet balance"""
-        if not self.wallet:
-            raise ValueError("No wallet loaded")
-            
-        try:
-            return {
-                'confirmed': self.wallet.getBalance('confirmed'),
-                'unconfirmed': self.wallet.getBalance('unconfirmed'),
-                'total': self.wallet.getBalance('total')
-            }
-        except Exception as e:
-            self.logger.error(f"Failed to get balance: {e}")
-            raise
+    def send_batch(self, outputs, fee_rate=None, wallet=None):
+        """Pay several (address, amount) outputs in one transaction
+        
+        Returns (operation id, Future of tx hash).
+        """
+        if not outputs:
+            raise ValueError("No outputs to send")
+        return self.submit('send_batch', {
+            'wallet': wallet or self.default_wallet,
+            'outputs': [(address, amount) for address, amount in outputs],
+            'fee_rate': fee_rate or self.config['max_fee_rate']
+        })
     
-    def get_transactions(self, count=10):
-        """Get recent transactions"""
-        if not self.wallet:
-            raise ValueError("No wallet loaded")
-            
-        try:
-            txs = self.wallet.getTransactions(count)
-            return [{
-                'txid': tx.getHash(),
-                'amount': tx.getValue(),
-                'timestamp': tx.getTimestamp(),
-                'confirmations': tx.getConfirmations()
-            } for tx in txs]
-        except Exception as e:
-            self.logger.error(f"Failed to get transactions: {e}")
-            raise
+    def _send_batch(self, params):
+        """Internal batched send: one transaction with an output per recipient"""
+        with self._using(params.get('wallet')) as (name, wallet, _):
+            try:
+                tx = wallet.createTx(recipValuePairs=params['outputs'], feeRate=params['fee_rate'])
+                wallet.broadcastTransaction(tx)
+                self.wallet_cache.invalidate(name)
+                self.logger.info(f"Batch transaction sent with {len(params['outputs'])} outputs: {tx.getHash()}")
+                return tx.getHash()
+            except Exception as e:
+                self.logger.error(f"Failed to send batch transaction: {e}")
+                raise
+    
+    def get_balance(self, wallet=None):
+        """Get wallet balance (cached until the chain state changes)"""
+        name = wallet or self.default_wallet
+        return self.wallet_cache.get_or_compute(('balance', name), lambda: self._call('get_balance', {'wallet': name}))
+    
+    def get_balances(self, names, timeout=None):
+        """Balances for many wallets, read concurrently on the executor
+        
+        Returns {name: balance} plus {name: error message} for wallets
+        that failed, including invalid or unknown names.
+        """
+        balances, errors, pending = {}, {}, {}
+        for name in names:
+            try:
+                check_wallet_name(name)
+            except InvalidWalletName as e:
+                errors[name if isinstance(name, str) else repr(name)] = str(e)
+                continue
+            if name in balances or name in errors or name in pending:
+                continue
+            cached = self.wallet_cache.get(('balance', name))
+            if cached is not None:
+                balances[name] = cached
+            elif not self.executor.is_running:
+                try:
+                    balances[name] = self.get_balance(name)
+                except Exception as e:
+                    errors[name] = str(e)
+            else:
+                state = self.wallet_cache.state(name)
+                pending[name] = (state, self.submit('get_balance', {'wallet': name})[1])
+        for name, (state, future) in pending.items():
+            try:
+                balances[name] = future.result(timeout)
+                self.wallet_cache.put(('balance', name), balances[name], state)
+            except Exception as e:
+                errors[name] = str(e)
+        return balances, errors
+    
+    def _get_balance(self, params):
+        """Internal balance lookup"""
+        with self._using(params.get('wallet')) as (_, wallet, _):
+            try:
+                return {
+                    'confirmed': wallet.getBalance('confirmed'),
+                    'unconfirmed': wallet.getBalance('unconfirmed'),
+                    'total': wallet.getBalance('total')
+                }
+            except Exception as e:
+                self.logger.error(f"Failed to get balance: {e}")
+                raise
+    
+    def _open_tx_index(self, name):
+        path = Path(self.config['data_dir']) / 'txindex' / f"{check_wallet_name(name)}.db"
+        return TransactionIndex(path, reorg_depth=self.config.get('reorg_depth', 6))
+    
+    def get_transactions(self, count=10, wallet=None):
+        """Get the most recent transactions"""
+        return self.query_transactions(limit=count, wallet=wallet)[0]
+    
+    def query_transactions(self, limit=10, cursor=None, wallet=None, **filters):
+        """Page through the transaction index; returns (transactions, next cursor)
+        
+        The index is synced at most once per chain state. filters are
+        passed to TransactionIndex.query (since, until, min_amount,
+        max_amount, direction).
+        """
+        with self._using(wallet) as (name, _, tx_index):
+            self.wallet_cache.get_or_compute(('tx_sync', name), lambda: self._call('sync_transactions', {'wallet': name}))
+            return tx_index.query(limit=limit, cursor=cursor, tip=self._tip_height(), **filters)
+    
+    def _sync_transactions(self, params):
+        """Internal transaction index sync"""
+        with self._using(params.get('wallet')) as (_, wallet, tx_index):
+            return tx_index.sync(wallet, self._tip_height())
 
 # Add BitcoinArmory endpoints to the API
 def register_bitcoin_endpoints(app, btc_manager):
@@ -210,20 +797,42 @@ def register_bitcoin_endpoints(app, btc_manager):
     def create_wallet():
         try:
             data = request.get_json()
-            btc_manager.create_wallet(
+            op_id = btc_manager.create_wallet(
                 name=data['name'],
                 password=data['password'],
                 network=data.get('network', 'mainnet')
             )
-            return jsonify({'status': 'success', 'message': 'Wallet creation initiated'})
+            return jsonify({'status': 'success', 'message': 'Wallet creation initiated', 'operation_id': op_id}), 202
+        except InvalidWalletName as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
         except Exception as e:
             return jsonify({'status': 'error', 'message': str(e)}), 500
     
     @app.route('/bitcoin/wallet/balance', methods=['GET'])
     def get_balance():
         try:
-            balance = btc_manager.get_balance()
+            balance = btc_manager.get_balance(request.args.get('wallet'))
             return jsonify({'status': 'success', 'balance': balance})
+        except InvalidWalletName as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        except Exception as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 500
+    
+    @app.route('/bitcoin/wallets', methods=['GET'])
+    def list_wallets():
+        try:
+            return jsonify({'status': 'success', **btc_manager.list_wallets()})
+        except Exception as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 500
+    
+    @app.route('/bitcoin/wallets/balances', methods=['POST'])
+    def get_balances():
+        try:
+            data = request.get_json()
+            if not isinstance(data.get('wallets'), list):
+                return jsonify({'status': 'error', 'message': "'wallets' must be a list of wallet names"}), 400
+            balances, errors = btc_manager.get_balances(data['wallets'], timeout=data.get('wait'))
+            return jsonify({'status': 'success', 'balances': balances, 'errors': errors})
         except Exception as e:
             return jsonify({'status': 'error', 'message': str(e)}), 500
     
@@ -231,20 +840,87 @@ def register_bitcoin_endpoints(app, btc_manager):
     def send_transaction():
         try:
             data = request.get_json()
-            tx_hash = btc_manager.send_transaction(
+            op_id, future = btc_manager.send_transaction(
                 to_address=data['to_address'],
                 amount=data['amount'],
-                fee_rate=data.get('fee_rate')
+                fee_rate=data.get('fee_rate'),
+                wallet=data.get('wallet')
             )
-            return jsonify({'status': 'success', 'tx_hash': tx_hash})
+            try:
+                tx_hash = future.result(timeout=data.get('wait', btc_manager.config.get('send_wait', 30)))
+            except FutureTimeoutError:
+                # Still running; the client polls /bitcoin/operations/<id>
+                return jsonify({'status': 'pending', 'operation_id': op_id, 'tx_hash': None}), 202
+            return jsonify({'status': 'success', 'operation_id': op_id, 'tx_hash': tx_hash})
+        except InvalidWalletName as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
         except Exception as e:
             return jsonify({'status': 'error', 'message': str(e)}), 500
     
+    @app.route('/bitcoin/transaction/send_batch', methods=['POST'])
+    def send_batch():
+        try:
+            data = request.get_json()
+            op_id, future = btc_manager.send_batch(
+                outputs=[(output['to_address'], output['amount']) for output in data['outputs']],
+                fee_rate=data.get('fee_rate'),
+                wallet=data.get('wallet')
+            )
+            try:
+                tx_hash = future.result(timeout=data.get('wait', btc_manager.config.get('send_wait', 30)))
+            except FutureTimeoutError:
+                return jsonify({'status': 'pending', 'operation_id': op_id, 'tx_hash': None}), 202
+            return jsonify({'status': 'success', 'operation_id': op_id, 'tx_hash': tx_hash})
+        except InvalidWalletName as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        except Exception as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 500
+    
+    @app.route('/bitcoin/operations/<op_id>', methods=['GET'])
+    def get_operation(op_id):
+        operation = btc_manager.operation_status(op_id)
+        if operation is None:
+            return jsonify({'status': 'error', 'message': 'Unknown operation'}), 404
+        return jsonify({'status': 'success', 'operation': operation})
+    
+    @app.route('/bitcoin/backups', methods=['GET'])
+    def list_backups():
+        if btc_manager.backups is None:
+            return jsonify({'status': 'success', 'enabled': False})
+        try:
+            return jsonify({
+                'status': 'success',
+                'enabled': True,
+                'snapshots': btc_manager.backups.snapshots(),
+                'stats': btc_manager.backups.stats()
+            })
+        except Exception as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 500
+    
+    @app.route('/bitcoin/backups', methods=['POST'])
+    def run_backup():
+        if btc_manager.backups is None or not btc_manager.backups.trigger():
+            return jsonify({'status': 'error', 'message': 'Automatic backups are not running'}), 409
+        return jsonify({'status': 'success', 'message': 'Backup started'}), 202
+    
     @app.route('/bitcoin/transactions', methods=['GET'])
     def get_transactions():
         try:
-            count = request.args.get('count', default=10, type=int)
-            transactions = btc_manager.get_transactions(count)
-            return jsonify({'status': 'success', 'transactions': transactions})
+            args = request.args
+            # A negative LIMIT means no limit to SQLite
+            limit = max(1, min(args.get('limit', default=args.get('count', default=10, type=int), type=int), 1000))
+            transactions, next_cursor = btc_manager.query_transactions(
+                limit=limit,
+                cursor=args.get('cursor'),
+                since=args.get('since', type=int),
+                until=args.get('until', type=int),
+                min_amount=args.get('min_amount', type=int),
+                max_amount=args.get('max_amount', type=int),
+                direction=args.get('direction'),
+                wallet=args.get('wallet')
+            )
+            return jsonify({'status': 'success', 'transactions': transactions, 'next_cursor': next_cursor})
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
         except Exception as e:
             return jsonify({'status': 'error', 'message': str(e)}), 500 
\ No newline at end of file
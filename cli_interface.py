@@ -1,5 +1,15 @@
-from core.recursive_loop import launch_core
+import argparse
 
-def run_cli():
-    print("🌐 KAIRO CLI Interface Online.")
-    launch_core()
+from recursive_loop import launch_core
+
+def run_cli(argv=None):
+    parser = argparse.ArgumentParser(description="KAIRO CLI")
+    parser.add_argument("--batch", metavar="FILE", help="answer one prompt per line of FILE ('-' for stdin) and exit")
+    parser.add_argument("--output", metavar="FILE", help="write batch results as NDJSON to FILE (default stdout)")
+    parser.add_argument("--concurrency", type=int, default=8, help="prompts in flight in batch mode")
+    parser.add_argument("--checkpoint", metavar="FILE", help="checkpoint file (default <output>.ckpt)")
+    args = parser.parse_args(argv)
+
+    if args.batch is None:
+        print("🌐 KAIRO CLI Interface Online.")
+    launch_core(batch=args.batch, output=args.output, concurrency=args.concurrency, checkpoint=args.checkpoint)
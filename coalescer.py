@@ -0,0 +1,119 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class RequestCoalescer:
+    """Single-flight deduplication and micro-batched dispatch of upstream calls.
+
+    Calls submitted with a key that is already in flight share that call's
+    future instead of starting a new one. New calls are held for up to
+    ``window`` seconds (or until ``max_batch`` are waiting) and then
+    dispatched together onto a pool of ``max_outstanding`` threads, which
+    caps the number of concurrent upstream requests.
+    """
+
+    def __init__(self, window=0.005, max_batch=32, max_outstanding=16):
+        self.logger = logging.getLogger('KairoAI.Coalescer')
+        self.window = window
+        self.max_batch = max_batch
+        self.max_outstanding = max_outstanding
+        self.stats_counters = {'submitted': 0, 'coalesced': 0, 'dispatched': 0, 'batches': 0}
+
+        self._cond = threading.Condition()
+        self._inflight = {}  # key -> Future shared by every waiter
+        self._pending = []  # (key, fn, future) waiting for the next batch
+        self._executor = None
+        self._dispatcher = None
+        self._pid = None
+        self._closed = False
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            window=float(os.getenv('KAIRO_COALESCE_WINDOW_MS', '5')) / 1000,
+            max_batch=int(os.getenv('KAIRO_COALESCE_MAX_BATCH', '32')),
+            max_outstanding=int(os.getenv('KAIRO_MAX_UPSTREAM_CALLS', '16'))
+        )
+
+    def _ensure_started(self):
+        # Threads do not survive a gunicorn fork, so start them per process
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._inflight.clear()
+        self._pending.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_outstanding, thread_name_prefix='kairo-upstream')
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name='kairo-coalescer', daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, key, fn):
+        """Schedule fn() under key and return a future for its result"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("RequestCoalescer is closed")
+            self._ensure_started()
+            self.stats_counters['submitted'] += 1
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats_counters['coalesced'] += 1
+                return future
+            future = Future()
+            self._inflight[key] = future
+            # Run fn in the caller's context so its request ID follows it into the pool
+            self._pending.append((key, contextvars.copy_context().run, fn, future))
+            self._cond.notify()
+            return future
+
+    def call(self, key, fn, timeout=None):
+        """Run fn() coalesced under key and wait for its result"""
+        return self.submit(key, fn).result(timeout)
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._pending:
+                    return
+                # Give concurrent arrivals a short window to join this batch
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+                self.stats_counters['batches'] += 1
+                self.stats_counters['dispatched'] += len(batch)
+
+            for key, run, fn, future in batch:
+                self._executor.submit(self._run, key, run, fn, future)
+
+    def _run(self, key, run, fn, future):
+        try:
+            result = run(fn)
+        except BaseException as e:
+            with self._cond:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+        else:
+            with self._cond:
+                self._inflight.pop(key, None)
+            future.set_result(result)
+
+    def stats(self):
+        with self._cond:
+            return {**self.stats_counters, 'in_flight': len(self._inflight), 'pending': len(self._pending)}
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._dispatcher is not None and self._pid == os.getpid():
+            self._dispatcher.join()
+            self._executor.shutdown(wait=True)
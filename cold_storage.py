@@ -0,0 +1,322 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from pathlib import Path
+
+from memory_index import entry_text, tokenize
+
+try:
+    import zstandard
+except ImportError:  # fall back to zlib
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: the service runs a single API process
+    fcntl = None
+
+# Common words left out of extractive summaries
+_STOPWORDS = frozenset(
+    'a about also an and are as at be been but by can could do for from had has have how i if in into '
+    'is it its just like me my no not of on or should so some than that the their them then there '
+    'they this to was we were what when where which who why will with would you your'.split()
+)
+
+
+def summarize_entries(entries, max_chars=600):
+    """Extractive summary of a run of turns: frequent terms plus opening lines"""
+    texts = [entry_text(entry) for entry in entries]
+    terms = Counter(
+        token for text in texts for token in tokenize(text)
+        if len(token) > 2 and token not in _STOPWORDS and not token.isdigit()
+    )
+    lines = [text.strip().splitlines()[0][:120] for text in texts if text.strip()]
+    summary = f"{len(texts)} earlier turns about {', '.join(term for term, _ in terms.most_common(8)) or 'various topics'}"
+    for line in lines:
+        if len(summary) + len(line) + 3 > max_chars:
+            break
+        summary += f" | {line}"
+    return summary
+
+
+class ColdStorage:
+    """Compressed archive for memory entries aged out of the hot store.
+
+    Entries are written in blocks of ``block_entries`` to
+    ``block-<first seq>-<last seq>.jsonl.zst`` (zstandard if installed,
+    otherwise ``.zz`` with zlib), so only the list of block ranges stays
+    in RAM and a lookup decompresses one block; the last ``cache_blocks``
+    decompressed blocks are kept. With ``summarize``, every run of up to
+    ``summary_run`` archived turns from one session is also condensed into
+    a summary record in ``summaries.jsonl``. The byte offsets of each
+    session's newest ``summary_index`` records are kept in RAM (and caught
+    up with records other processes append), so fetching a session's
+    summaries reads only those records.
+    """
+
+    def __init__(self, path, block_entries=10000, summarize=True, summary_run=50,
+                 summarizer=summarize_entries, cache_blocks=2, level=None, summary_index=16):
+        self.logger = logging.getLogger('KairoAI.ColdStorage')
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.block_entries = block_entries
+        self.summarize = summarize
+        self.summary_run = summary_run
+        self.summarizer = summarizer
+        self.cache_blocks = cache_blocks
+        self.codec = 'zst' if zstandard is not None else 'zz'
+        self.level = level if level is not None else (10 if self.codec == 'zst' else 6)
+
+        self.blocks = []  # sorted (first seq, last seq, file name)
+        self._firsts = []
+        self._cache = OrderedDict()
+        self.summary_index = summary_index
+        self._summary_offsets = {}  # session -> deque of (offset, length), oldest first
+        self._summary_indexed = 0  # bytes of summaries.jsonl indexed so far
+        self._lock = threading.RLock()
+        self._lock_file = None
+        self._lock_pid = None
+        self._refresh()
+
+    @contextmanager
+    def _exclusive(self):
+        # Several processes may archive at once; the lock file serializes them
+        if self._lock_pid != os.getpid():
+            self._lock_file = open(self.path / 'LOCK', 'a+b')
+            self._lock_pid = os.getpid()
+        if fcntl:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Re-read the block list (blocks may be written by other processes)"""
+        blocks = []
+        for p in self.path.glob('block-*.jsonl.*'):
+            _, first, last = p.name.split('.', 1)[0].split('-')
+            blocks.append((int(first), int(last), p.name))
+        blocks.sort()
+        self.blocks = blocks
+        self._firsts = [block[0] for block in blocks]
+
+    @property
+    def last_seq(self):
+        return self.blocks[-1][1] if self.blocks else -1
+
+    def _find(self, seq):
+        """Index of the block holding seq, or None"""
+        i = bisect.bisect_right(self._firsts, seq) - 1
+        return i if i >= 0 and seq <= self.blocks[i][1] else None
+
+    def _compress(self, data):
+        if self.codec == 'zst':
+            return zstandard.ZstdCompressor(level=self.level).compress(data)
+        return zlib.compress(data, self.level)
+
+    @staticmethod
+    def _decompress(name, data):
+        if name.endswith('.zst'):
+            if zstandard is None:
+                raise RuntimeError(f"{name} needs the zstandard package")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return zlib.decompress(data)
+
+    def _write_block(self, items):
+        first, last = items[0][0], items[-1][0]
+        name = f"block-{first:020d}-{last:020d}.jsonl.{self.codec}"
+        raw = b''.join(json.dumps(item).encode('utf-8') + b'\n' for item in items)
+        tmp = self.path / f"{name}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(self._compress(raw))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path / name)
+        return len(raw)
+
+    def add(self, items):
+        """Archive (seq, entry) pairs given in increasing seq order; returns how many were new
+
+        Ranges may arrive out of order (processes archive in the background),
+        so only entries already inside a block are skipped.
+        """
+        added = raw_bytes = 0
+        with self._lock, self._exclusive():
+            self._refresh()
+            batch = []
+            for seq, entry in items:
+                if self._find(seq) is not None:
+                    continue  # another process archived it already
+                if batch:
+                    # Blocks must not overlap, so a block archived by someone
+                    # else between the batch and seq closes the batch
+                    j = bisect.bisect_right(self._firsts, batch[-1][0])
+                    if j < len(self._firsts) and self._firsts[j] < seq:
+                        raw_bytes += self._flush(batch)
+                        added += len(batch)
+                        batch = []
+                batch.append((seq, entry))
+                if len(batch) >= self.block_entries:
+                    raw_bytes += self._flush(batch)
+                    added += len(batch)
+                    batch = []
+            if batch:
+                raw_bytes += self._flush(batch)
+                added += len(batch)
+            self._refresh()
+        if added:
+            self.logger.info(f"Archived {added} memory entries ({raw_bytes} bytes before compression)")
+        return added
+
+    def _flush(self, batch):
+        raw_bytes = self._write_block(batch)
+        if self.summarize:
+            self._write_summaries(batch)
+        return raw_bytes
+
+    def _write_summaries(self, batch):
+        runs = OrderedDict()
+        for seq, entry in batch:
+            session = entry.get('session') if isinstance(entry, dict) else None
+            runs.setdefault(session, []).append((seq, entry))
+        records = []
+        for session, items in runs.items():
+            for i in range(0, len(items), self.summary_run):
+                run = items[i:i + self.summary_run]
+                records.append({
+                    'role': 'system',
+                    'summary': True,
+                    'session': session,
+                    'first_seq': run[0][0],
+                    'last_seq': run[-1][0],
+                    'count': len(run),
+                    'archived_at': time.time(),
+                    'text': self.summarizer([entry for _, entry in run])
+                })
+        records.sort(key=lambda record: record['last_seq'])
+        with open(self.path / 'summaries.jsonl', 'ab') as f:
+            f.write(b''.join(json.dumps(record).encode('utf-8') + b'\n' for record in records))
+
+    def _block(self, i):
+        first, last, name = self.blocks[i]
+        items = self._cache.get(name)
+        if items is None:
+            with open(self.path / name, 'rb') as f:
+                raw = self._decompress(name, f.read())
+            items = dict(json.loads(line) for line in raw.splitlines())
+            self._cache[name] = items
+            if len(self._cache) > self.cache_blocks:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(name)
+        return items
+
+    def get(self, seq):
+        """Return the archived entry with sequence number seq, or None"""
+        with self._lock:
+            i = self._find(seq)
+            if i is None:
+                # Blocks may have been written since, and not necessarily in order
+                self._refresh()
+                i = self._find(seq)
+            if i is None:
+                return None
+            return self._block(i).get(seq)
+
+    def scan(self, start_seq=0):
+        """Yield archived (seq, entry) pairs from start_seq onwards"""
+        with self._lock:
+            self._refresh()
+            blocks = list(self.blocks)
+        for first, last, name in blocks:
+            if last < start_seq:
+                continue
+            with open(self.path / name, 'rb') as f:
+                raw = self._decompress(name, f.read())
+            for line in raw.splitlines():
+                seq, entry = json.loads(line)
+                if seq >= start_seq:
+                    yield seq, entry
+
+    def _index_summaries(self, path):
+        """Index summary records appended since the last call"""
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            size = 0
+        if size < self._summary_indexed:
+            # Replaced or truncated; start over
+            self._summary_offsets = {}
+            self._summary_indexed = 0
+        if size == self._summary_indexed:
+            return
+        with open(path, 'rb') as f:
+            f.seek(self._summary_indexed)
+            data = f.read(size - self._summary_indexed)
+        # A record still being written has no newline yet
+        data = data[:data.rfind(b'\n') + 1]
+        offset = self._summary_indexed
+        for line in data.splitlines(keepends=True):
+            session = json.loads(line).get('session')
+            offsets = self._summary_offsets.get(session)
+            if offsets is None:
+                offsets = self._summary_offsets[session] = deque(maxlen=self.summary_index)
+            offsets.append((offset, len(line)))
+            offset += len(line)
+        self._summary_indexed = offset
+
+    def summaries(self, count=10, session=None):
+        """Return up to count of the newest summary records, oldest first
+
+        With a session, only that session's records (at most
+        ``summary_index`` of them) are returned.
+        """
+        path = self.path / 'summaries.jsonl'
+        if count <= 0 or not path.exists():
+            return []
+        if session is not None:
+            with self._lock:
+                self._index_summaries(path)
+                offsets = list(self._summary_offsets.get(session, ()))[-count:]
+            if not offsets:
+                return []
+            records = []
+            with open(path, 'rb') as f:
+                for offset, length in offsets:
+                    f.seek(offset)
+                    records.append(json.loads(f.read(length)))
+            return records
+        found = []
+        with open(path, 'rb') as f:
+            size = f.seek(0, os.SEEK_END)
+            # Read backwards in growing chunks until enough records are found
+            chunk = 64 * 1024
+            while True:
+                start = max(0, size - chunk)
+                f.seek(start)
+                lines = f.read(size - start).splitlines()
+                if start:
+                    lines = lines[1:]  # may be a partial record
+                found = [json.loads(line) for line in lines if line]
+                if len(found) >= count or not start:
+                    return found[-count:]
+                chunk *= 4
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            compressed = sum((self.path / name).stat().st_size for _, _, name in self.blocks)
+            return {
+                'blocks': len(self.blocks),
+                'entries': sum(last - first + 1 for first, last, _ in self.blocks),
+                'compressed_bytes': compressed,
+                'codec': self.codec
+            }
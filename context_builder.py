@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from memory_index import entry_text
+
+try:
+    import tiktoken
+except ImportError:  # fall back to a length-based estimate
+    tiktoken = None
+
+
+class TokenCounter:
+    """Counts prompt tokens, remembering counts for texts seen recently"""
+
+    def __init__(self, model="gpt-4", cache_size=50000):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("cl100k_base")
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, text):
+        with self._lock:
+            n = self._cache.get(text)
+            if n is not None:
+                self._cache.move_to_end(text)
+                return n
+        n = len(self.encoding.encode(text)) if self.encoding else max(1, len(text) // 4)
+        with self._lock:
+            self._cache[text] = n
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return n
+
+
+class ContextBuilder:
+    """Packs recent and relevant memory turns into a prompt token budget.
+
+    Conversation turns are stored as ``{"role", "text", "session",
+    "tokens"}`` entries, so a turn's token count is computed once when it
+    is remembered; older plain-text entries are counted through the
+    TokenCounter cache. ``build()`` fills the budget with the session's
+    most recent turns first, then with summaries of its archived turns
+    (``summaries`` of them) and then with relevant older entries.
+    Requests without a session get no history at all, since there is no
+    way to tell their turns apart from other clients'.
+    """
+
+    def __init__(self, memory, budget=None, relevant_k=None, recent_window=200, max_recent=20, model="gpt-4",
+                 summaries=None):
+        self.memory = memory
+        self.budget = budget if budget is not None else int(os.getenv("KAIRO_CONTEXT_TOKENS", "1500"))
+        self.relevant_k = relevant_k if relevant_k is not None else int(os.getenv("KAIRO_RECALL_K", "3"))
+        self.summaries = summaries if summaries is not None else int(os.getenv("KAIRO_CONTEXT_SUMMARIES", "2"))
+        # How far back in the shared history to look for this session's turns
+        self.recent_window = recent_window
+        self.max_recent = max_recent
+        self.counter = TokenCounter(model)
+
+    def turn(self, role, text, session=None):
+        """Build a memory entry for one conversation turn"""
+        return {"role": role, "text": text, "session": session, "tokens": self.counter.count(text), "at": time.time()}
+
+    def _tokens(self, entry):
+        if isinstance(entry, dict) and "tokens" in entry:
+            return entry["tokens"]
+        return self.counter.count(entry_text(entry))
+
+    @staticmethod
+    def _session(entry):
+        return entry.get("session") if isinstance(entry, dict) else None
+
+    def build(self, input_text, session=None):
+        """Return context messages to place between the system prompt and input_text"""
+        budget = self.budget - self.counter.count(input_text)
+        if session is None or budget <= 0:
+            return []
+
+        # Earlier copies of the same prompt (retries) are skipped so they share one key
+        def usable(entry):
+            return self._session(entry) == session and entry_text(entry) != input_text
+
+        recent = []
+        for entry in reversed(self.memory.recall(self.recent_window)):
+            if len(recent) >= self.max_recent:
+                break
+            if not usable(entry):
+                continue
+            cost = self._tokens(entry)
+            if cost > budget:
+                break
+            recent.append(entry)
+            budget -= cost
+        recent.reverse()
+
+        # Older turns of this session that were archived are represented by their summaries
+        summaries = []
+        if self.summaries and budget > 0:
+            for record in reversed(self.memory.summaries(session, self.summaries)):
+                cost = self.counter.count(record["text"])
+                if cost > budget:
+                    break
+                summaries.append(record["text"])
+                budget -= cost
+            summaries.reverse()
+
+        notes = []
+        if self.relevant_k and budget > 0:
+            seen = {entry_text(entry) for entry in recent}
+            # Over-fetch because hits from other sessions are dropped
+            for entry in self.memory.recall_relevant(input_text, self.relevant_k * 4):
+                if len(notes) >= self.relevant_k:
+                    break
+                text = entry_text(entry)
+                if not usable(entry) or text in seen:
+                    continue
+                cost = self._tokens(entry)
+                if cost > budget:
+                    continue
+                notes.append(text)
+                seen.add(text)
+                budget -= cost
+
+        messages = []
+        if summaries:
+            listed = "\n".join(f"- {text}" for text in summaries)
+            messages.append({"role": "system", "content": f"Summary of earlier parts of this conversation:\n{listed}"})
+        if notes:
+            listed = "\n".join(f"- {text}" for text in notes)
+            messages.append({"role": "system", "content": f"Relevant things from earlier in this conversation:\n{listed}"})
+        for entry in recent:
+            role = entry.get("role", "user") if isinstance(entry, dict) else "user"
+            messages.append({"role": role, "content": entry_text(entry)})
+        return messages
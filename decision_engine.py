@@ -1,10 +1,60 @@
+import logging
+import time
+
+from coalescer import RequestCoalescer
+from context_builder import ContextBuilder
+import tracing
+from metrics import timed
 from nlp_processor import NLPProcessor
 
 class DecisionEngine:
-    def __init__(self, memory):
+    def __init__(self, memory, recall_k=None, coalescer=None, context_tokens=None):
+        self.logger = logging.getLogger('KairoAI.DecisionEngine')
         self.memory = memory
         self.nlp = NLPProcessor()
+        # Shares identical in-flight prompts and batches upstream dispatch
+        self.coalescer = coalescer if coalescer is not None else RequestCoalescer.from_env()
+        # Packs recent and related turns (recall_k of them) into the prompt budget
+        self.context = ContextBuilder(memory, budget=context_tokens, relevant_k=recall_k, model=self.nlp.model)
+
+    def process(self, input_data, use_cache=True, session=None):
+        start = time.perf_counter()
+        with timed('decision_engine_process'):
+            with tracing.span('context_build'):
+                context = self.context.build(input_data, session)
+            self.memory.remember(self.context.turn("user", input_data, session))
+            # Cache hits are answered here, without the coalescing window or a thread hop
+            response = self.nlp.cached_response(input_data, context) if use_cache else None
+            if response is None:
+                # use_cache=False calls only share with each other, never with cacheable ones
+                key = (self.nlp.response_key(input_data, context), use_cache)
+                # Includes time spent waiting on a coalesced duplicate
+                with tracing.span('coalesced_call'):
+                    response = self.coalescer.call(
+                        key, lambda: self.nlp.generate_response(input_data, use_cache=False, context=context)
+                    )
+            self.memory.remember(self.context.turn("assistant", response, session))
+        self.logger.info("Processed input", extra={
+            "session": session,
+            "context_messages": len(context),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3)
+        })
+        return response
+
+    def stream(self, input_data, use_cache=True, session=None):
+        """Like process, but yields response tokens as they are generated"""
+        context = self.context.build(input_data, session)
+        self.memory.remember(self.context.turn("user", input_data, session))
+        tokens = self.nlp.stream_response(input_data, use_cache=use_cache, context=context)
+
+        def relay():
+            received = []
+            try:
+                for token in tokens:
+                    received.append(token)
+                    yield token
+            finally:
+                tokens.close()
+            self.memory.remember(self.context.turn("assistant", "".join(received), session))
 
-    def process(self, input_data):
-        self.memory.remember(input_data)
-        return self.nlp.generate_response(input_data)
+        return relay()
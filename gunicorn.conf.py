@@ -0,0 +1,75 @@
+import os
+import shutil
+import signal
+import time
+
+bind = os.getenv("KAIRO_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("KAIRO_WORKERS", "4"))
+# gthread workers let streaming responses share a worker while they wait on the LLM
+worker_class = "gthread"
+threads = int(os.getenv("KAIRO_THREADS", "32"))
+# Import the app (and its heavy dependencies) once in the master so that
+# forked workers share those pages copy-on-write
+preload_app = os.getenv("KAIRO_PRELOAD", "1").lower() not in ("0", "false", "no")
+# Seconds a stopping worker gets to finish requests and drain queued work
+graceful_timeout = int(os.getenv("KAIRO_GRACEFUL_TIMEOUT", "30"))
+# Recycle workers after this many requests (0 = never), staggered by the jitter
+max_requests = int(os.getenv("KAIRO_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("KAIRO_MAX_REQUESTS_JITTER", "0"))
+
+# Zero-downtime reloads: SIGHUP starts fresh workers before the old ones
+# stop gracefully. With preload_app the code is loaded once in the master,
+# so new code needs USR2 (start a new master), then WINCH and QUIT the old one.
+
+# Workers write metric samples here so /metrics can aggregate all of them.
+# This must be set before prometheus_client is imported by the app, and
+# with preload_app that import happens before any server hook runs.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/kairo-metrics")
+# A master re-executed by USR2 (GUNICORN_FD set) shares the directory with the old one
+if os.environ.get("KAIRO_METRICS_OWNER") != str(os.getpid()) and "GUNICORN_FD" not in os.environ:
+    # Samples left over from a previous run would be summed into the new one;
+    # the owner marker keeps a config reload from wiping live samples
+    os.environ["KAIRO_METRICS_OWNER"] = str(os.getpid())
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+def when_ready(server):
+    if preload_app:
+        import api_interface
+        api_interface.preload()
+
+
+def post_worker_init(worker):
+    # Threads and connections don't survive fork, so each worker starts its own
+    import api_interface
+    api_interface.startup()
+
+    # The master kills a stopping worker graceful_timeout seconds after
+    # SIGTERM (a quick stop with INT or QUIT gives no time at all), so note
+    # the deadline for worker_exit; finishing requests has used part of it
+    def on_stop(grace, previous):
+        def handler(sig, frame):
+            if getattr(worker, "stop_deadline", None) is None:
+                worker.stop_deadline = time.monotonic() + grace
+            previous(sig, frame)
+        return handler
+
+    for sig, grace in ((signal.SIGTERM, graceful_timeout), (signal.SIGINT, 0), (signal.SIGQUIT, 0)):
+        previous = signal.getsignal(sig)
+        if callable(previous):
+            signal.signal(sig, on_stop(grace, previous))
+
+
+def worker_exit(server, worker):
+    # Runs in the worker after it has stopped accepting and finished its
+    # requests; drain in what is left of the graceful window, keeping a few
+    # seconds in hand (a worker recycled by max_requests gets the whole window)
+    import api_interface
+    deadline = getattr(worker, "stop_deadline", None) or time.monotonic() + graceful_timeout
+    api_interface.shutdown(drain_timeout=max(0, deadline - time.monotonic() - 5))
+
+
+def child_exit(server, worker):
+    import metrics
+    metrics.mark_process_dead(worker.pid)
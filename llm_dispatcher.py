@@ -0,0 +1,330 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import tracing
+
+logger = logging.getLogger('KairoAI.LLMDispatcher')
+
+
+class CircuitBreaker:
+    """Stops sending to a backend after ``failure_threshold`` consecutive failures.
+
+    Once open, the backend is skipped for ``reset_after`` seconds; then a
+    single trial request is let through (half-open) and its outcome closes
+    or reopens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_after=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.reset_after else 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_after or self.trial:
+                return False
+            self.trial = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial = False
+
+    def release(self):
+        """Give back a half-open trial that ended without an outcome (e.g. cancelled)"""
+        with self._lock:
+            self.trial = False
+
+
+class LatencyTracker:
+    """Latencies of the last ``window`` successful calls"""
+
+    def __init__(self, window=200):
+        self.samples = deque(maxlen=window)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, pct):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Backend:
+    """One model on one OpenAI-compatible endpoint"""
+
+    def __init__(self, name, model, base_url=None, api_key_env='OPENAI_API_KEY', timeout=60.0,
+                 failure_threshold=5, reset_after=30.0):
+        self.name = name
+        self.model = model
+        self.base_url = base_url
+        self.api_key_env = api_key_env
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_after)
+        self.latency = LatencyTracker()
+        self.counters = {'requests': 0, 'successes': 0, 'failures': 0, 'cancelled': 0}
+
+    def _client(self, runtime):
+        return runtime.client(base_url=self.base_url, api_key=os.getenv(self.api_key_env), max_retries=0)
+
+    async def complete(self, runtime, messages):
+        self.counters['requests'] += 1
+        start = time.perf_counter()
+        try:
+            with tracing.span('llm_backend', backend=self.name, model=self.model):
+                response = await asyncio.wait_for(
+                    self._client(runtime).chat.completions.create(model=self.model, messages=messages),
+                    self.timeout
+                )
+        except asyncio.CancelledError:
+            # Lost a hedge race; says nothing about this backend's health
+            self.counters['cancelled'] += 1
+            self.breaker.release()
+            raise
+        except Exception:
+            self.counters['failures'] += 1
+            self.breaker.failure()
+            raise
+        self.counters['successes'] += 1
+        self.breaker.success()
+        self.latency.add(time.perf_counter() - start)
+        return response.choices[0].message.content
+
+    async def open_stream(self, runtime, messages):
+        """Start a streamed completion, waiting at most timeout for the response to begin"""
+        self.counters['requests'] += 1
+        try:
+            with tracing.span('llm_stream_open', backend=self.name, model=self.model):
+                stream = await asyncio.wait_for(
+                    self._client(runtime).chat.completions.create(model=self.model, messages=messages, stream=True),
+                    self.timeout
+                )
+        except asyncio.CancelledError:
+            self.counters['cancelled'] += 1
+            self.breaker.release()
+            raise
+        except Exception:
+            self.counters['failures'] += 1
+            self.breaker.failure()
+            raise
+        return stream
+
+    def stats(self):
+        def ms(seconds):
+            return round(seconds * 1000, 1) if seconds is not None else None
+        return {
+            'model': self.model,
+            'base_url': self.base_url,
+            'state': self.breaker.state,
+            **self.counters,
+            'p50_ms': ms(self.latency.percentile(50)),
+            'p95_ms': ms(self.latency.percentile(95)),
+            'p99_ms': ms(self.latency.percentile(99))
+        }
+
+
+class LLMDispatcher:
+    """Sends each completion to an ordered list of backends.
+
+    The first backend whose circuit is closed gets the request. If it
+    fails, the next one is tried. If it has not answered after its
+    ``hedge_percentile`` latency (``initial_hedge_delay`` until
+    ``min_samples`` latencies are known), one hedged request goes to the
+    next backend, the first answer wins and the other request is
+    cancelled. Hedges are limited to ``max_hedge_ratio`` of requests so a
+    general slowdown doesn't double upstream load. Streams fall back to
+    the next backend only until the first token arrives.
+    """
+
+    def __init__(self, backends, runtime, hedge_percentile=95, initial_hedge_delay=2.0,
+                 min_hedge_delay=0.05, min_samples=20, max_hedge_ratio=0.1):
+        if not backends:
+            raise ValueError("LLMDispatcher needs at least one backend")
+        self.backends = backends
+        self.runtime = runtime
+        self.hedge_percentile = hedge_percentile
+        self.initial_hedge_delay = initial_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+        self.max_hedge_ratio = max_hedge_ratio
+        self.counters = {'requests': 0, 'hedged': 0, 'hedge_wins': 0, 'fallbacks': 0, 'failed': 0}
+
+    @classmethod
+    def from_env(cls, model, runtime):
+        """Backends from KAIRO_LLM_BACKENDS (a JSON list of Backend keyword
+        arguments), or a single backend for model on OPENAI_BASE_URL"""
+        failure_threshold = int(os.getenv('KAIRO_BREAKER_FAILURES', '5'))
+        reset_after = float(os.getenv('KAIRO_BREAKER_RESET_S', '30'))
+        timeout = float(os.getenv('KAIRO_LLM_TIMEOUT', '60'))
+        specs = json.loads(os.getenv('KAIRO_LLM_BACKENDS') or 'null') or [
+            {'name': 'primary', 'model': model, 'base_url': os.getenv('OPENAI_BASE_URL')}
+        ]
+        backends = [
+            Backend(**{'failure_threshold': failure_threshold, 'reset_after': reset_after,
+                       'timeout': timeout, 'name': f"backend-{i}", **spec})
+            for i, spec in enumerate(specs)
+        ]
+        return cls(
+            backends,
+            runtime,
+            hedge_percentile=float(os.getenv('KAIRO_HEDGE_PERCENTILE', '95')),
+            initial_hedge_delay=float(os.getenv('KAIRO_HEDGE_DELAY_MS', '2000')) / 1000,
+            max_hedge_ratio=float(os.getenv('KAIRO_HEDGE_RATIO', '0.1'))
+        )
+
+    def hedge_delay(self, backend):
+        if len(backend.latency.samples) < self.min_samples:
+            return self.initial_hedge_delay
+        return max(self.min_hedge_delay, backend.latency.percentile(self.hedge_percentile))
+
+    def _may_hedge(self):
+        return self.counters['hedged'] < self.max_hedge_ratio * self.counters['requests']
+
+    def _next_backend(self, after):
+        """The next backend after index ``after`` whose circuit lets a request through
+
+        Returns (index, backend) or (None, None). allow() is only asked for
+        a backend that is about to be called, because for a half-open
+        circuit it hands out the single trial request.
+        """
+        for i in range(after + 1, len(self.backends)):
+            if self.backends[i].breaker.allow():
+                return i, self.backends[i]
+        return None, None
+
+    async def complete(self, messages):
+        """Return the first successful completion of messages"""
+        self.counters['requests'] += 1
+        loop = asyncio.get_running_loop()
+        tasks = {}
+        position = -1
+        hedging = True
+        hedge = None
+        error = None
+
+        def launch():
+            nonlocal position
+            position, backend = self._next_backend(position)
+            if backend is None:
+                position = len(self.backends)
+                return None
+            tasks[asyncio.ensure_future(backend.complete(self.runtime, messages))] = backend
+            return backend
+
+        primary = launch()
+        if primary is None:
+            raise RuntimeError("All LLM backends are unavailable (circuits open)")
+        hedge_at = loop.time() + self.hedge_delay(primary)
+        try:
+            while tasks:
+                timeout = None
+                if hedging and position < len(self.backends) - 1 and self._may_hedge():
+                    timeout = max(0.0, hedge_at - loop.time())
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # One hedge per request
+                    hedging = False
+                    hedge = launch()
+                    if hedge is not None:
+                        self.counters['hedged'] += 1
+                    continue
+                for task in done:
+                    backend = tasks.pop(task)
+                    if task.exception() is None:
+                        if backend is hedge:
+                            self.counters['hedge_wins'] += 1
+                        return task.result()
+                    error = task.exception()
+                    logger.warning(f"LLM backend {backend.name} failed: {error!r}")
+                if not tasks:
+                    # Fall back; the primary's hedge timer no longer applies
+                    hedging = False
+                    if launch() is not None:
+                        self.counters['fallbacks'] += 1
+            self.counters['failed'] += 1
+            raise error
+        finally:
+            # Cancelling the loser also aborts its HTTP request
+            for task in tasks:
+                task.cancel()
+
+    async def stream(self, messages):
+        """Yield completion tokens, falling back to the next backend until the first token"""
+        self.counters['requests'] += 1
+        error = None
+        position = -1
+        while True:
+            position, backend = self._next_backend(position)
+            if backend is None:
+                break
+            if error is not None:
+                self.counters['fallbacks'] += 1
+            start = time.perf_counter()
+            try:
+                # Settles the breaker itself if the stream cannot be opened
+                stream = await backend.open_stream(self.runtime, messages)
+            except Exception as e:
+                error = e
+                logger.warning(f"LLM backend {backend.name} failed before streaming: {e!r}")
+                continue
+            started = False
+            settled = False
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        started = True
+                        yield chunk.choices[0].delta.content
+                settled = True
+            except Exception as e:
+                settled = True
+                backend.counters['failures'] += 1
+                backend.breaker.failure()
+                if started:
+                    raise
+                error = e
+                logger.warning(f"LLM backend {backend.name} failed before streaming: {e!r}")
+                continue
+            finally:
+                if not settled:
+                    # Closed or cancelled by the consumer; says nothing about the backend
+                    backend.counters['cancelled'] += 1
+                    backend.breaker.release()
+            backend.breaker.success()
+            backend.counters['successes'] += 1
+            backend.latency.add(time.perf_counter() - start)
+            return
+        self.counters['failed'] += 1
+        raise error or RuntimeError("All LLM backends are unavailable (circuits open)")
+
+    def stats(self):
+        return {
+            **self.counters,
+            'backends': {backend.name: backend.stats() for backend in self.backends}
+        }
@@ -0,0 +1,217 @@
+"""Asynchronous structured logging.
+
+Loggers hand records to a bounded queue and a background thread does the
+JSON formatting and batched I/O, so a log call on a request thread costs
+an append. When the queue is full, records are dropped and counted rather
+than blocking the caller. Debug and info records can be sampled per
+logger; warnings and errors are always kept. Every record carries the
+request ID of the request that produced it (see ``request_id``).
+"""
+import atexit
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+# Set per request in api_interface; copied into coalescer threads and LLM tasks
+request_id = contextvars.ContextVar('request_id', default=None)
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including ``extra`` fields"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None)
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of records below WARNING for loggers listed in rates
+
+    A rate applies to the named logger and its children, e.g.
+    ``{'KairoAI.BitcoinArmory': 0.1}`` keeps one in ten.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self.sampled_out = 0
+        self._resolved = {}
+
+    def _rate(self, name):
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            probe = name
+            while probe:
+                if probe in self.rates:
+                    rate = self.rates[probe]
+                    break
+                probe = probe.rpartition('.')[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class AsyncLogHandler(logging.Handler):
+    """Handler that enqueues records without blocking and writes them in batches
+
+    Records go onto a deque (appends are atomic, so callers take no lock)
+    holding at most ``maxsize`` records. A writer thread per process
+    wakes every ``flush_interval`` seconds, formats everything queued and
+    writes it to stream with a single write and flush.
+    """
+
+    def __init__(self, stream, maxsize=10000, flush_interval=0.05):
+        super().__init__()
+        self.stream = stream
+        self.maxsize = maxsize
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.queue = deque()
+        self._stop = threading.Event()
+        self._writer = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_writer(self):
+        # The writer thread does not survive a gunicorn fork; each process starts its own
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = deque()
+            self._stop = threading.Event()
+            self._writer = threading.Thread(target=self._write_loop, args=(self.queue, self._stop), name='kairo-log-writer', daemon=True)
+            self._writer.start()
+            self._pid = os.getpid()
+
+    def handle(self, record):
+        # The deque needs no locking, so skip the handler lock Handler.handle would take
+        if not self.filter(record):
+            return False
+        self.emit(record)
+        return True
+
+    def emit(self, record):
+        self._ensure_writer()
+        if len(self.queue) >= self.maxsize:
+            self.dropped += 1
+            return
+        # Formatting is left to the writer; only capture per-request state here
+        record.request_id = request_id.get()
+        self.queue.append(record)
+
+    def _write_loop(self, work, stop):
+        while True:
+            stopping = stop.wait(self.flush_interval)
+            lines = []
+            for _ in range(len(work)):
+                record = work.popleft()
+                try:
+                    lines.append(self.format(record))
+                except Exception:
+                    self.handleError(record)
+            if lines:
+                try:
+                    self.stream.write('\n'.join(lines) + '\n')
+                    self.stream.flush()
+                except Exception:
+                    self.handleError(record)
+            if stopping and not work:
+                return
+
+    def stats(self):
+        return {
+            'queued': len(self.queue),
+            'dropped': self.dropped,
+            'sampled_out': sum(f.sampled_out for f in self.filters if isinstance(f, SamplingFilter))
+        }
+
+    def close(self):
+        """Write everything queued so far and stop the writer"""
+        if self._writer is not None and self._pid == os.getpid():
+            self._stop.set()
+            self._writer.join()
+            self._writer = None
+            self._pid = None
+        super().close()
+
+
+def parse_rates(spec):
+    """Parse "logger=rate,logger=rate" into a dict"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, _, rate = item.partition('=')
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+_handler = None
+
+
+def setup_logging(level=None, sample_rates=None, queue_size=None, stream=None):
+    """Route the root logger through the asynchronous pipeline (idempotent)
+
+    Defaults come from KAIRO_LOG_LEVEL, KAIRO_LOG_SAMPLE (e.g.
+    "KairoAI.BitcoinArmory=0.1") and KAIRO_LOG_QUEUE.
+    """
+    global _handler
+    if _handler is not None:
+        return _handler
+    level = level or os.getenv('KAIRO_LOG_LEVEL', 'INFO')
+    if sample_rates is None:
+        sample_rates = parse_rates(os.getenv('KAIRO_LOG_SAMPLE'))
+    queue_size = queue_size or int(os.getenv('KAIRO_LOG_QUEUE', '10000'))
+
+    _handler = AsyncLogHandler(stream or sys.stderr, maxsize=queue_size)
+    _handler.setFormatter(JsonFormatter())
+    _handler.addFilter(SamplingFilter(sample_rates))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_handler)
+    atexit.register(shutdown)
+    return _handler
+
+
+def stats():
+    """Pipeline counters, or None if setup_logging() has not run"""
+    return _handler.stats() if _handler is not None else None
+
+
+def shutdown():
+    """Flush queued records and stop the listener"""
+    global _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler.close()
+        _handler = None
@@ -1,9 +1,626 @@
+import json
+import logging
+import mmap
+import os
+import queue
+import sqlite3
+import struct
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+
+from cold_storage import ColdStorage
+from memory_index import MemoryIndex
+from metrics import timed
+
+try:
+    import fcntl
+except ImportError:  # Windows: the service runs a single API process
+    fcntl = None
+
+# Each index slot is the end offset of one record in the segment log
+_OFFSET = struct.Struct('<Q')
+
+
+class InvalidCursor(ValueError):
+    """Raised by Memory.page() for a cursor it did not hand out"""
+
+
+def entry_time(entry):
+    """When an entry was remembered, or None for entries without a timestamp"""
+    at = entry.get('at') if isinstance(entry, dict) else None
+    return at if isinstance(at, (int, float)) else None
+
+
+class SegmentStore:
+    """Append-only segment log with an in-RAM ring buffer for the hot tail.
+
+    Entries are written as JSON lines to ``segment-<base>.log`` and the end
+    offset of each one is appended to ``segment-<base>.idx``. Both files are
+    memory-mapped for reads, so any entry can be fetched in O(1) and opening
+    a store only reads the index size plus the last ``capacity`` entries.
+    When the log holds more than ``max_entries * compact_ratio`` entries it
+    is compacted down to the newest ``max_entries``; with ``max_age``
+    (seconds), entries older than that are compacted away too, checked
+    every ``age_check_every`` appends. The newest ``capacity`` entries are
+    never aged out, and neither are entries without a timestamp (or any
+    entry after one). Compacted entries go to ``archive`` (a ColdStorage)
+    if one is given, and are dropped otherwise; a background thread
+    archives them so appends don't wait on compression.
+
+    Appends take an exclusive file lock, so several processes may share one
+    directory; each picks up the others' entries on its next call.
+    """
+
+    def __init__(self, path=None, capacity=1000, max_entries=100000, compact_ratio=1.5, fsync=False,
+                 archive=None, max_age=None, age_check_every=1000):
+        self.logger = logging.getLogger('KairoAI.Memory')
+        self.path = Path(path) if path else Path.home() / '.kairoai' / 'memory'
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.capacity = capacity
+        self.max_entries = max(max_entries, capacity)
+        self.compact_ratio = compact_ratio
+        self.fsync = fsync
+        self.archive = archive
+        self.max_age = max_age
+        self.age_check_every = age_check_every
+
+        self.ring = deque(maxlen=capacity)
+        self.base = 0
+        self._count = 0
+        self._log = None
+        self._idx = None
+        self._log_map = None
+        self._idx_map = None
+        self._lock = threading.RLock()
+        self._lock_file = open(self.path / 'LOCK', 'a+b')
+        self._lock_pid = os.getpid()
+        self._archive_queue = None  # compacted ranges waiting for the archiver thread
+        self._archiver = None
+        self._archiver_pid = None
+
+        with self._lock, self._exclusive():
+            self._open_segment(recover=True)
+
+    # -- file management -------------------------------------------------
+
+    @contextmanager
+    def _exclusive(self):
+        if self._lock_pid != os.getpid():
+            # flock is shared with the parent after a fork (e.g. gunicorn preload)
+            self._lock_file = open(self.path / 'LOCK', 'a+b')
+            self._lock_pid = os.getpid()
+        if fcntl:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _segment_path(self, base, suffix):
+        return self.path / f"segment-{base:020d}.{suffix}"
+
+    def _current_base(self):
+        bases = [
+            int(p.stem.split('-', 1)[1])
+            for p in self.path.glob('segment-*.idx')
+            if p.with_suffix('.log').exists()
+        ]
+        return max(bases) if bases else 0
+
+    def _open_segment(self, recover=False):
+        self._close_files()
+        self.base = self._current_base()
+        self._log = open(self._segment_path(self.base, 'log'), 'a+b')
+        self._idx = open(self._segment_path(self.base, 'idx'), 'a+b')
+        if recover:
+            self._recover()
+        self._count = os.fstat(self._idx.fileno()).st_size // _OFFSET.size
+        self.ring.clear()
+        start = max(0, self._count - self.capacity)
+        self.ring.extend(self._read(i) for i in range(start, self._count))
+
+    def _recover(self):
+        """Drop torn writes and segments left behind by an interrupted compaction"""
+        for stale in self.path.glob('segment-*'):
+            if not stale.name.startswith(f"segment-{self.base:020d}."):
+                stale.unlink()
+
+        log_size = os.fstat(self._log.fileno()).st_size
+        count = os.fstat(self._idx.fileno()).st_size // _OFFSET.size
+        self._count = count
+        while count and self._end_offset(count - 1) > log_size:
+            count -= 1
+        self._idx.truncate(count * _OFFSET.size)
+        self._log.truncate(self._end_offset(count - 1) if count else 0)
+        self._unmap()
+
+    def _close_files(self):
+        self._unmap()
+        for f in (self._log, self._idx):
+            if f:
+                f.close()
+        self._log = self._idx = None
+
+    def _unmap(self):
+        for m in (self._log_map, self._idx_map):
+            if m is not None:
+                m.close()
+        self._log_map = self._idx_map = None
+
+    def _mapped(self, attr, f, size):
+        m = getattr(self, attr)
+        if m is None or len(m) < size:
+            if m is not None:
+                m.close()
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            setattr(self, attr, m)
+        return m
+
+    def _end_offset(self, i):
+        idx_map = self._mapped('_idx_map', self._idx, (i + 1) * _OFFSET.size)
+        return _OFFSET.unpack_from(idx_map, i * _OFFSET.size)[0]
+
+    def _read(self, i):
+        """Decode the i-th entry of the current segment"""
+        start = self._end_offset(i - 1) if i else 0
+        end = self._end_offset(i)
+        log_map = self._mapped('_log_map', self._log, end)
+        return json.loads(log_map[start:end])
+
+    def _sync(self):
+        """Pick up compactions and appends made by other processes"""
+        try:
+            current = os.stat(self._segment_path(self.base, 'idx')).st_ino
+        except FileNotFoundError:
+            current = None
+        if current != os.fstat(self._idx.fileno()).st_ino:
+            self._open_segment()
+            return
+
+        count = os.fstat(self._idx.fileno()).st_size // _OFFSET.size
+        if count > self._count:
+            start = max(self._count, count - self.capacity)
+            self.ring.extend(self._read(i) for i in range(start, count))
+            self._count = count
+
+    # -- public API ------------------------------------------------------
+
+    def append(self, data):
+        """Append an entry and return its sequence number"""
+        return self.extend([data])
+
+    def extend(self, entries):
+        """Append entries with one write and return the last sequence number (None if empty)"""
+        entries = list(entries)
+        if not entries:
+            return None
+        lines = [json.dumps(data).encode('utf-8') + b'\n' for data in entries]
+        with self._lock, self._exclusive():
+            self._sync()
+            expected = self._end_offset(self._count - 1) if self._count else 0
+            if os.fstat(self._log.fileno()).st_size != expected:
+                # Another writer died mid-append; discard its partial record
+                self._log.truncate(expected)
+                self._idx.truncate(self._count * _OFFSET.size)
+
+            offsets = []
+            end = expected
+            for line in lines:
+                end += len(line)
+                offsets.append(_OFFSET.pack(end))
+            self._log.write(b''.join(lines))
+            self._log.flush()
+            self._idx.write(b''.join(offsets))
+            self._idx.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+                os.fsync(self._idx.fileno())
+
+            previous = self._count
+            self._count += len(entries)
+            self.ring.extend(entries)
+            seq = self.base + self._count - 1
+            if self._count > self.max_entries * self.compact_ratio:
+                self._compact(self._count - self.max_entries)
+            elif self.max_age and self._count // self.age_check_every != previous // self.age_check_every:
+                expired = self._expired()
+                if expired:
+                    self._compact(expired)
+            return seq
+
+    def tail(self, count=None):
+        """Return the newest count entries, oldest first (the hot tail if None)"""
+        with self._lock:
+            self._sync()
+            if count is None:
+                return list(self.ring)
+            count = min(count, self._count)
+            if count <= 0:
+                return []
+            if count <= len(self.ring):
+                return list(islice(reversed(self.ring), count))[::-1]
+            cold = [self._read(i) for i in range(self._count - count, self._count - len(self.ring))]
+            return cold + list(self.ring)
+
+    def get(self, seq):
+        """Return the entry with sequence number seq, or None if compacted away"""
+        with self._lock:
+            self._sync()
+            i = seq - self.base
+            if 0 <= i < self._count:
+                return self._read(i)
+            return None
+
+    def scan(self, start_seq=0, batch_size=1000):
+        """Yield (seq, entry) for retained entries from start_seq onwards.
+
+        The lock is only held per batch, so appends and compactions can
+        interleave with a long scan.
+        """
+        seq = start_seq
+        while True:
+            with self._lock:
+                self._sync()
+                seq = max(seq, self.base)
+                start = seq - self.base
+                stop = min(start + batch_size, self._count)
+                batch = [(self.base + i, self._read(i)) for i in range(start, stop)]
+            if not batch:
+                return
+            yield from batch
+            seq = batch[-1][0] + 1
+
+    def __len__(self):
+        with self._lock:
+            self._sync()
+            return self._count
+
+    def _expired(self):
+        """Count the leading entries older than max_age, stopping at the first undated one"""
+        cutoff = time.time() - self.max_age
+        limit = max(0, self._count - self.capacity)
+        count = 0
+        while count < limit:
+            at = entry_time(self._read(count))
+            if at is None or at >= cutoff:
+                break
+            count += 1
+        return count
+
+    def _archive_later(self, base, data, ends):
+        """Queue a compacted range (raw log bytes and end offsets) for the archiver thread"""
+        if self._archiver_pid != os.getpid():
+            # Threads do not survive a fork, so start one per process
+            self._archiver_pid = os.getpid()
+            self._archive_queue = queue.Queue()
+            self._archiver = threading.Thread(target=self._archive_loop, name='kairo-memory-archiver', daemon=True)
+            self._archiver.start()
+        self._archive_queue.put((base, data, ends))
+
+    def _archive_loop(self):
+        while True:
+            job = self._archive_queue.get()
+            if job is None:
+                return
+            base, data, ends = job
+            items = []
+            start = 0
+            for i, end in enumerate(ends):
+                items.append((base + i, json.loads(data[start:end])))
+                start = end
+            try:
+                self.archive.add(items)
+            except Exception:
+                self.logger.exception(f"Failed to archive compacted entries {base}-{base + len(ends) - 1}")
+
+    def _compact(self, drop):
+        """Rewrite the segment without its oldest drop entries, queueing them for the archive"""
+        cut = self._end_offset(drop - 1)
+        log_end = self._end_offset(self._count - 1)
+        new_base = self.base + drop
+
+        log_map = self._mapped('_log_map', self._log, log_end)
+        if self.archive is not None:
+            # Copy the dropped range out before its file is deleted; decoding
+            # and compressing it happen off the lock
+            idx_map = self._mapped('_idx_map', self._idx, self._count * _OFFSET.size)
+            self._archive_later(self.base, log_map[:cut], struct.unpack_from(f'<{drop}Q', idx_map, 0))
+        new_log = self._segment_path(new_base, 'log')
+        new_idx = self._segment_path(new_base, 'idx')
+        with open(f"{new_log}.tmp", 'wb') as f:
+            f.write(log_map[cut:log_end])
+            f.flush()
+            os.fsync(f.fileno())
+        kept = self._count - drop
+        idx_map = self._mapped('_idx_map', self._idx, self._count * _OFFSET.size)
+        ends = struct.unpack_from(f'<{kept}Q', idx_map, drop * _OFFSET.size)
+        with open(f"{new_idx}.tmp", 'wb') as f:
+            f.write(struct.pack(f'<{kept}Q', *(end - cut for end in ends)))
+            f.flush()
+            os.fsync(f.fileno())
+
+        # The .idx rename publishes the new segment to other processes
+        os.replace(f"{new_log}.tmp", new_log)
+        os.replace(f"{new_idx}.tmp", new_idx)
+        old_base = self.base
+        self._close_files()
+        for suffix in ('log', 'idx'):
+            self._segment_path(old_base, suffix).unlink()
+
+        self.base = new_base
+        self._log = open(new_log, 'a+b')
+        self._idx = open(new_idx, 'a+b')
+        self._count = kept
+        self.logger.info(f"Compacted memory log: {'archived' if self.archive else 'dropped'} {drop} entries")
+
+    def close(self):
+        if self._archiver is not None and self._archiver_pid == os.getpid():
+            # Let queued compactions reach the archive first
+            self._archive_queue.put(None)
+            self._archiver.join()
+            self._archiver = None
+        with self._lock:
+            self._close_files()
+            self._lock_file.close()
+
+
+class SQLiteStore:
+    """Memory store in a SQLite database in WAL mode.
+
+    WAL lets any number of processes read concurrently while one writes,
+    so every gunicorn worker sees the same history. Each thread gets its
+    own connection. Every ``prune_every`` appends, entries beyond the
+    newest ``max_entries`` (or older than ``max_age`` seconds, sparing
+    the newest ``capacity`` and stopping at the first entry without a
+    timestamp) are moved to ``archive`` if given, and deleted.
+    """
+
+    def __init__(self, path=None, capacity=1000, max_entries=100000, prune_every=1000, archive=None, max_age=None):
+        self.logger = logging.getLogger('KairoAI.Memory')
+        directory = Path(path) if path else Path.home() / '.kairoai' / 'memory'
+        directory.mkdir(parents=True, exist_ok=True)
+        self.db_path = directory / 'memory.db'
+        self.capacity = capacity
+        self.max_entries = max(max_entries, capacity)
+        self.prune_every = prune_every
+        self.archive = archive
+        self.max_age = max_age
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'seq INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT NOT NULL)'
+        )
+        conn.commit()
+
+    def _conn(self):
+        # Connections must not be shared across threads or inherited by forks
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @property
+    def base(self):
+        row = self._conn().execute('SELECT MIN(seq) FROM entries').fetchone()
+        return row[0] if row[0] is not None else 0
+
+    def append(self, data):
+        """Append an entry and return its sequence number"""
+        return self.extend([data])
+
+    def extend(self, entries):
+        """Append entries in one transaction and return the last sequence number (None if empty)"""
+        conn = self._conn()
+        first = seq = None
+        pruned = []
+        with conn:
+            for data in entries:
+                seq = conn.execute('INSERT INTO entries (data) VALUES (?)', (json.dumps(data),)).lastrowid
+                if first is None:
+                    first = seq
+            if seq is not None and seq // self.prune_every != (first - 1) // self.prune_every:
+                pruned = self._prune(conn, seq)
+        if pruned:
+            # Archive after commit so compression doesn't hold the write lock
+            try:
+                self.archive.add((row_seq, json.loads(data)) for row_seq, data in pruned)
+            except Exception:
+                self.logger.exception(f"Failed to archive pruned entries {pruned[0][0]}-{pruned[-1][0]}")
+        return seq
+
+    def _prune(self, conn, seq):
+        """Delete entries past the limits; returns the deleted (seq, data) rows to archive"""
+        cut = seq - self.max_entries
+        if self.max_age:
+            # The oldest entry that is recent or undated ends the expired run
+            oldest = seq - self.capacity
+            row = conn.execute(
+                "SELECT seq FROM entries WHERE seq <= ? AND (COALESCE(json_type(data, '$.at'), '') "
+                "NOT IN ('integer', 'real') OR json_extract(data, '$.at') >= ?) ORDER BY seq LIMIT 1",
+                (oldest, time.time() - self.max_age)
+            ).fetchone()
+            cut = max(cut, row[0] - 1 if row else oldest)
+        rows = []
+        if self.archive is not None:
+            rows = conn.execute('SELECT seq, data FROM entries WHERE seq <= ? ORDER BY seq', (cut,)).fetchall()
+        conn.execute('DELETE FROM entries WHERE seq <= ?', (cut,))
+        return rows
+
+    def tail(self, count=None):
+        """Return the newest count entries, oldest first (the hot tail if None)"""
+        count = self.capacity if count is None else count
+        if count <= 0:
+            return []
+        rows = self._conn().execute(
+            'SELECT data FROM entries ORDER BY seq DESC LIMIT ?', (count,)
+        ).fetchall()
+        return [json.loads(row[0]) for row in reversed(rows)]
+
+    def get(self, seq):
+        """Return the entry with sequence number seq, or None if pruned"""
+        row = self._conn().execute('SELECT data FROM entries WHERE seq = ?', (seq,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def scan(self, start_seq=0, batch_size=1000):
+        """Yield (seq, entry) for retained entries from start_seq onwards"""
+        seq = start_seq
+        while True:
+            rows = self._conn().execute(
+                'SELECT seq, data FROM entries WHERE seq >= ? ORDER BY seq LIMIT ?',
+                (seq, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            for row_seq, data in rows:
+                yield row_seq, json.loads(data)
+            seq = rows[-1][0] + 1
+
+    def __len__(self):
+        return self._conn().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+STORES = {
+    'segment': SegmentStore,
+    'sqlite': SQLiteStore
+}
+
+
+def open_store(backend=None, **kwargs):
+    """Create the memory store selected by KAIRO_MEMORY_BACKEND"""
+    backend = backend or os.getenv('KAIRO_MEMORY_BACKEND', 'segment')
+    if backend not in STORES:
+        raise ValueError(f"Unknown memory backend: {backend}")
+    kwargs.setdefault('path', os.getenv('KAIRO_MEMORY_DIR'))
+    kwargs.setdefault('capacity', int(os.getenv('KAIRO_MEMORY_CAPACITY', '1000')))
+    kwargs.setdefault('max_entries', int(os.getenv('KAIRO_MEMORY_MAX_ENTRIES', '100000')))
+    max_age_days = os.getenv('KAIRO_MEMORY_MAX_AGE_DAYS')
+    kwargs.setdefault('max_age', float(max_age_days) * 86400 if max_age_days else None)
+    if 'archive' not in kwargs and os.getenv('KAIRO_MEMORY_ARCHIVE', '1').lower() not in ('0', 'false', 'no'):
+        # Entries leaving the hot store are archived rather than dropped
+        directory = Path(kwargs['path']) if kwargs['path'] else Path.home() / '.kairoai' / 'memory'
+        kwargs['archive'] = ColdStorage(
+            directory / 'cold',
+            summarize=os.getenv('KAIRO_MEMORY_SUMMARIES', '1').lower() not in ('0', 'false', 'no')
+        )
+    return STORES[backend](**kwargs)
+
+
 class Memory:
-    def __init__(self):
-        self.store = []
+    def __init__(self, store=None, embedder=None):
+        self.store = store if store is not None else open_store()
+        self.index = MemoryIndex(embedder=embedder)
+        self._index_lock = threading.Lock()
 
     def remember(self, data):
-        self.store.append(data)
+        with timed('memory_remember'):
+            self.store.append(data)
+
+    @property
+    def archive(self):
+        return getattr(self.store, 'archive', None)
 
     def recall(self, count=None):
-        return self.store if count is None else self.store[-count:]
+        """Return the newest count entries, oldest first"""
+        return self.store.tail(count)
+
+    def summaries(self, session, count=2):
+        """Summaries of the session's archived turns, oldest first
+
+        These stand in for turns that have left the hot store; empty
+        without an archive or with summaries turned off.
+        """
+        archive = self.archive
+        if archive is None or not archive.summarize or session is None:
+            return []
+        return archive.summaries(count, session=session)
+
+    def get(self, seq):
+        """Return the entry with sequence number seq from the hot store or the archive"""
+        entry = self.store.get(seq)
+        if entry is None and self.archive is not None:
+            entry = self.archive.get(seq)
+        return entry
+
+    def scan(self, start_seq=0, archived=False):
+        """Yield (seq, entry) in sequence order without loading everything
+
+        With archived=True, entries moved to cold storage come first.
+        """
+        seq = start_seq
+        if archived and self.archive is not None:
+            for seq_, entry in self.archive.scan(start_seq):
+                yield seq_, entry
+                seq = seq_ + 1
+        yield from self.store.scan(seq)
+
+    def page(self, cursor=None, limit=100, archived=False):
+        """Return (entries, next cursor) for the limit entries after cursor
+
+        Entries are {"seq", "entry"} dicts, oldest first. The cursor is
+        the next sequence number as a string, or None on the last page.
+        """
+        try:
+            start = int(cursor) if cursor else 0
+        except ValueError:
+            raise InvalidCursor(f"Invalid cursor: {cursor!r}") from None
+        items = list(islice(self.scan(start, archived), limit + 1))
+        next_cursor = str(items[limit][0]) if len(items) > limit else None
+        return [{"seq": seq, "entry": entry} for seq, entry in items[:limit]], next_cursor
+
+    def import_entries(self, entries, chunk_size=1000):
+        """Append entries from an iterable in chunks; returns (count, first seq, last seq)
+
+        Imported entries get new sequence numbers after the existing ones.
+        """
+        count = 0
+        first = last = None
+        entries = iter(entries)
+        while True:
+            chunk = list(islice(entries, chunk_size))
+            if not chunk:
+                return count, first, last
+            with timed('memory_import_chunk'):
+                last = self.store.extend(chunk)
+            if first is None:
+                first = last - len(chunk) + 1
+            count += len(chunk)
+
+    def _refresh_index(self):
+        """Index entries appended since the last query (by any process)"""
+        with self._index_lock:
+            base = self.store.base
+            if self.index.dead_count(base) > len(self.index) // 2:
+                # Most indexed entries were compacted away; rebuild from the log
+                self.index.clear()
+            for seq, entry in self.store.scan(self.index.last_seq + 1):
+                self.index.add(seq, entry)
+
+    def recall_relevant(self, query, k=5):
+        """Return up to k stored entries most relevant to query, best first"""
+        self._refresh_index()
+        hits = self.index.search(query, k, min_seq=self.store.base)
+        entries = (self.store.get(seq) for seq, _ in hits)
+        return [entry for entry in entries if entry is not None]
+
+    def __len__(self):
+        return len(self.store)
+
+    def close(self):
+        self.store.close()
@@ -0,0 +1,142 @@
+import json
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+
+# Imported by the first MemoryIndex, so importing this module doesn't load NumPy
+np = None
+
+_TOKEN = re.compile(r"\w+")
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+def entry_text(entry):
+    """Text used to index a memory entry"""
+    if isinstance(entry, str):
+        return entry
+    if isinstance(entry, dict) and isinstance(entry.get('text'), str):
+        return entry['text']
+    return json.dumps(entry)
+
+
+def _load_numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+
+
+class MemoryIndex:
+    """Incremental relevance index over memory entries.
+
+    Every entry is added to a token inverted index whose postings are
+    compact arrays, so a query is scored with vectorized BM25 over the
+    matching postings and a NumPy top-k instead of a Python loop. If an
+    ``embedder`` (text -> 1-D vector) is given, normalized embeddings are
+    kept in a matrix that grows ``chunk_size`` rows at a time and cosine
+    similarity is added to the score.
+
+    Entries must be added in increasing ``seq`` order.
+    """
+
+    def __init__(self, embedder=None, embedding_weight=1.0, chunk_size=65536):
+        self.embedder = embedder
+        self.embedding_weight = embedding_weight
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        _load_numpy()
+        self.clear()
+
+    def clear(self):
+        self._postings = {}  # token -> (doc ids, term frequencies)
+        self._seqs = array('q')
+        self._doc_len = array('I')
+        self._total_len = 0
+        self._vectors = None
+
+    def __len__(self):
+        return len(self._seqs)
+
+    @property
+    def last_seq(self):
+        return self._seqs[-1] if self._seqs else -1
+
+    def dead_count(self, min_seq):
+        """Number of indexed entries older than min_seq"""
+        with self._lock:
+            seqs = np.frombuffer(self._seqs, dtype=np.int64)
+            return int(np.searchsorted(seqs, min_seq))
+
+    def add(self, seq, entry):
+        text = entry_text(entry)
+        terms = Counter(tokenize(text))
+        vector = self._embed(text) if self.embedder else None
+        with self._lock:
+            doc = len(self._seqs)
+            for term, tf in terms.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = (array('I'), array('H'))
+                postings[0].append(doc)
+                postings[1].append(min(tf, 0xFFFF))
+            length = sum(terms.values())
+            self._seqs.append(seq)
+            self._doc_len.append(length)
+            self._total_len += length
+            if vector is not None:
+                self._store_vector(doc, vector)
+
+    def _embed(self, text):
+        vector = np.asarray(self.embedder(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _store_vector(self, doc, vector):
+        if self._vectors is None:
+            self._vectors = np.zeros((self.chunk_size, vector.shape[0]), dtype=np.float32)
+        elif doc >= self._vectors.shape[0]:
+            grown = np.zeros((self._vectors.shape[0] + self.chunk_size, self._vectors.shape[1]), dtype=np.float32)
+            grown[:doc] = self._vectors[:doc]
+            self._vectors = grown
+        self._vectors[doc] = vector
+
+    def search(self, query, k=5, min_seq=0):
+        """Return up to k (seq, score) pairs for entries relevant to query"""
+        terms = set(tokenize(query))
+        qvector = self._embed(query) if self.embedder else None
+        with self._lock:
+            n = len(self._seqs)
+            if not n or k <= 0:
+                return []
+            seqs = np.frombuffer(self._seqs, dtype=np.int64)
+            doc_len = np.frombuffer(self._doc_len, dtype=np.uint32)
+            avg_len = self._total_len / n or 1.0
+
+            scores = np.zeros(n, dtype=np.float32)
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                docs = np.frombuffer(postings[0], dtype=np.uint32)
+                tf = np.frombuffer(postings[1], dtype=np.uint16).astype(np.float32)
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                norm = K1 * (1 - B + B * doc_len[docs] / avg_len)
+                scores[docs] += idf * tf * (K1 + 1) / (tf + norm)
+
+            if qvector is not None and self._vectors is not None:
+                scores += self.embedding_weight * (self._vectors[:n] @ qvector)
+
+            scores[:np.searchsorted(seqs, min_seq)] = 0
+            k = min(k, n)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(int(seqs[i]), float(scores[i])) for i in top if scores[i] > 0]
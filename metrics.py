@@ -0,0 +1,104 @@
+"""Prometheus metrics for the KairoAI hot paths.
+
+Under gunicorn, PROMETHEUS_MULTIPROC_DIR (set in gunicorn.conf.py) makes
+every worker write its samples to shared mmap files; ``render()`` then
+aggregates all workers into one exposition.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+import tracing
+
+# Buckets span sub-millisecond cache hits up to slow LLM completions
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+REQUEST_LATENCY = Histogram(
+    'kairo_http_request_duration_seconds',
+    'HTTP request latency by route',
+    ['method', 'route', 'status'],
+    buckets=LATENCY_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    'kairo_stage_duration_seconds',
+    'Time spent in hot-path stages',
+    ['stage'],
+    buckets=LATENCY_BUCKETS
+)
+MEMORY_ENTRIES = Gauge(
+    'kairo_memory_entries',
+    'Entries retained in the memory store',
+    multiprocess_mode='livemostrecent'
+)
+BITCOIN_QUEUE_DEPTH = Gauge(
+    'kairo_bitcoin_queue_depth',
+    'Bitcoin operations waiting to be processed',
+    multiprocess_mode='livesum'
+)
+BITCOIN_OPERATION_LATENCY = Histogram(
+    'kairo_bitcoin_operation_duration_seconds',
+    'BitcoinArmory operation latency',
+    ['operation', 'status'],
+    buckets=LATENCY_BUCKETS
+)
+ADMISSION_REJECTED = Counter(
+    'kairo_admission_rejected_total',
+    'Requests shed by admission control',
+    ['reason']
+)
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# Label children are bound once so the hot path skips the labels() lookup
+_stages = {}
+
+
+@contextmanager
+def timed(stage):
+    """Record the duration of the enclosed block under STAGE_LATENCY and as a trace span"""
+    child = _stages.get(stage)
+    if child is None:
+        child = _stages[stage] = STAGE_LATENCY.labels(stage)
+    start = time.perf_counter()
+    try:
+        with tracing.span(stage):
+            yield
+    finally:
+        child.observe(time.perf_counter() - start)
+
+
+def observe_request(method, route, status, seconds):
+    REQUEST_LATENCY.labels(method, route, str(status)).observe(seconds)
+
+
+def observe_bitcoin_operation(operation, status, seconds):
+    BITCOIN_OPERATION_LATENCY.labels(operation, status).observe(seconds)
+
+
+def render():
+    """Return the exposition payload, aggregated across workers if needed"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def mark_process_dead(pid):
+    """Drop a dead worker's live gauges (gunicorn child_exit hook)"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
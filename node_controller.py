@@ -1,11 +1,228 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+logger = logging.getLogger('KairoAI.NodeController')
+
+def _run_timed(task, args, kwargs):
+    """Run task in a pool worker and report when it actually ran"""
+    started = time.time()
+    result = task(*args, **kwargs)
+    return result, started, time.time()
+
+
 class NodeController:
-    def __init__(self):
-        self.units = []
+    """Scheduler for swarm units.
+
+    Plain callables are CPU-bound units and run on a process pool (or a
+    thread pool with ``cpu_mode="thread"``; process units must be
+    picklable). Coroutine functions are I/O-bound units (e.g. LLM calls)
+    and run on a background event loop, at most ``io_concurrency`` at a
+    time. At most ``max_pending`` units may be queued or running;
+    spawn_unit blocks or raises queue.Full beyond that. report() covers
+    live units plus the last ``history`` finished ones.
+    """
+
+    def __init__(self, cpu_workers=None, cpu_mode="process", io_concurrency=32, max_pending=1000, history=1000):
+        self.cpu_workers = cpu_workers or os.cpu_count() or 1
+        self.cpu_mode = cpu_mode
+        self.io_concurrency = io_concurrency
+        self.max_pending = max_pending
+
+        self.units = OrderedDict()  # live units by id
+        self.finished = deque(maxlen=history)
+        self.counts = {"spawned": 0, "completed": 0, "failed": 0, "cancelled": 0, "timeout": 0}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._cpu_pool = None
+        self._loop = None
+        self._io_limit = None
+        self._deadlines = []  # heap of (monotonic deadline, unit id) for CPU units with a timeout
+        self._expiry = threading.Condition()
+        self._expiry_thread = None
+
+    def _cpu(self):
+        if self._cpu_pool is None:
+            pool = ProcessPoolExecutor if self.cpu_mode == "process" else ThreadPoolExecutor
+            self._cpu_pool = pool(max_workers=self.cpu_workers)
+        return self._cpu_pool
+
+    def _io(self):
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._io_limit = asyncio.Semaphore(self.io_concurrency)
+            threading.Thread(target=self._loop.run_forever, name="swarm-io", daemon=True).start()
+        return self._loop
+
+    def spawn_unit(self, task, *args, kind=None, timeout=None, block=True, wait=None, **kwargs):
+        """Schedule task(*args, **kwargs) and return the unit id.
+
+        kind is "cpu" or "io" (inferred from task when omitted). With
+        block=False, or when wait seconds pass, a full scheduler raises
+        queue.Full.
+        """
+        if not callable(task):
+            raise TypeError(f"Unit task must be callable, got {task!r}")
+        kind = kind or ("io" if asyncio.iscoroutinefunction(task) else "cpu")
+        if not self._slots.acquire(blocking=block, timeout=wait if block else None):
+            raise queue.Full("Swarm is at max_pending units")
 
-    def spawn_unit(self, task):
-        unit_id = len(self.units) + 1
-        self.units.append({"id": unit_id, "task": task})
-        print(f"[SWARM] Unit {unit_id} spawned for task: {task}")
+        with self._lock:
+            unit_id = next(self._ids)
+            unit = {
+                "id": unit_id,
+                "task": getattr(task, "__name__", repr(task)),
+                "kind": kind,
+                "status": "queued",
+                "submitted": time.time(),
+                "started": None,
+                "finished": None,
+                "duration": None
+            }
+            self.units[unit_id] = unit
+            self.counts["spawned"] += 1
+
+        try:
+            if kind == "io":
+                future = asyncio.run_coroutine_threadsafe(self._run_io(unit, task, args, kwargs, timeout), self._io())
+            else:
+                future = self._cpu().submit(_run_timed, task, args, kwargs)
+                future.add_done_callback(lambda f: self._cpu_done(unit, f))
+        except Exception:
+            self._finish(unit, "failed", error="could not schedule unit")
+            raise
+        with self._lock:
+            # A fast unit may already be finished; finished units never hold their future
+            if unit_id in self.units:
+                unit["_future"] = future
+        if kind != "io" and timeout is not None:
+            self._schedule_expiry(unit_id, timeout)
+        logger.info(f"Unit {unit_id} spawned for task: {unit['task']}")
+        return unit_id
+
+    async def _run_io(self, unit, task, args, kwargs, timeout):
+        async with self._io_limit:
+            if unit["status"] != "queued":
+                return
+            unit["status"] = "running"
+            unit["started"] = time.time()
+            try:
+                result = await asyncio.wait_for(task(*args, **kwargs), timeout)
+            except asyncio.TimeoutError:
+                self._finish(unit, "timeout")
+            except asyncio.CancelledError:
+                self._finish(unit, "cancelled")
+                raise
+            except Exception as e:
+                self._finish(unit, "failed", error=str(e))
+            else:
+                self._finish(unit, "completed", result=result)
+
+    def _cpu_done(self, unit, future):
+        expired = unit.get("_expired", False)
+        if future.cancelled():
+            self._finish(unit, "timeout" if expired else "cancelled")
+            return
+        error = future.exception()
+        if error is not None:
+            self._finish(unit, "failed", error=str(error))
+            return
+        result, started, finished = future.result()
+        unit["started"] = started
+        if expired:
+            self._finish(unit, "timeout", finished=finished)
+        else:
+            self._finish(unit, "completed", result=result, finished=finished)
+
+    def _schedule_expiry(self, unit_id, timeout):
+        # One thread waits on a heap of deadlines instead of a Timer per unit
+        with self._expiry:
+            heapq.heappush(self._deadlines, (time.monotonic() + timeout, unit_id))
+            if self._expiry_thread is None:
+                self._expiry_thread = threading.Thread(target=self._expiry_loop, name="swarm-expiry", daemon=True)
+                self._expiry_thread.start()
+            self._expiry.notify()
+
+    def _expiry_loop(self):
+        while True:
+            with self._expiry:
+                while not self._deadlines or self._deadlines[0][0] > time.monotonic():
+                    self._expiry.wait(self._deadlines[0][0] - time.monotonic() if self._deadlines else None)
+                _, unit_id = heapq.heappop(self._deadlines)
+            with self._lock:
+                unit = self.units.get(unit_id)
+                future = unit.get("_future") if unit is not None else None
+            # Outside the lock: cancelling runs _cpu_done, which takes it
+            if future is not None:
+                self._expire(unit, future)
+
+    def _expire(self, unit, future):
+        # A unit that already started cannot be interrupted; it keeps its slot
+        # until it ends and is then reported as timed out
+        unit["_expired"] = True
+        future.cancel()
+
+    def _public(self, unit):
+        future = unit.get("_future")
+        if unit["status"] == "queued" and unit["kind"] == "cpu" and future is not None and future.running():
+            unit["status"] = "running"
+        return {k: v for k, v in unit.items() if not k.startswith("_")}
+
+    def _finish(self, unit, status, result=None, error=None, finished=None):
+        with self._lock:
+            if unit["id"] not in self.units:
+                return
+            del self.units[unit["id"]]
+            unit.pop("_future", None)
+            unit.pop("_expired", None)
+            unit["status"] = status
+            unit["finished"] = finished or time.time()
+            if unit["started"] is not None:
+                unit["duration"] = unit["finished"] - unit["started"]
+            if error is not None:
+                unit["error"] = error
+            if status == "completed":
+                unit["result"] = result
+            self.finished.append(unit)
+            self.counts[status] += 1
+        self._slots.release()
+
+    def cancel(self, unit_id):
+        """Cancel a queued unit (or a running I/O unit); returns True on success"""
+        with self._lock:
+            unit = self.units.get(unit_id)
+        if unit is None:
+            return False
+        future = unit.get("_future")
+        if unit["kind"] == "io" and future is not None:
+            future.cancel()
+            if unit["status"] == "queued":
+                self._finish(unit, "cancelled")
+            return True
+        return bool(future and future.cancel())
 
     def report(self):
-        return self.units
+        """Live state: counters, active units and recently finished units"""
+        with self._lock:
+            live = [self._public(unit) for unit in self.units.values()]
+            return {
+                **self.counts,
+                "queued": sum(1 for unit in live if unit["status"] == "queued"),
+                "running": sum(1 for unit in live if unit["status"] == "running"),
+                "active": live,
+                "recent": list(self.finished)
+            }
+
+    def shutdown(self, wait=True):
+        if self._cpu_pool is not None:
+            self._cpu_pool.shutdown(wait=wait, cancel_futures=True)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
@@ -0,0 +1,95 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class ProfilerBusy(RuntimeError):
+    """Raised when a profile is requested while another one is running"""
+
+
+class SamplingProfiler:
+    """On-demand sampling profiler for the threads of this process.
+
+    While a profile runs, the requesting thread snapshots every other
+    thread's Python stack each ``interval`` seconds and counts identical
+    stacks. Samples are wall-clock, so threads blocked on a lock, a queue
+    or a socket show up as well as threads burning CPU. Nothing runs while
+    no profile is active; request_finished() is then a single attribute
+    check. Under gunicorn each worker profiles only itself.
+    """
+
+    def __init__(self, interval=0.005, max_depth=128):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+        self._count_lock = threading.Lock()
+        self._remaining = None  # requests left to profile, when counting requests
+        self._done = threading.Event()
+
+    @property
+    def active(self):
+        return self._lock.locked()
+
+    def request_finished(self):
+        """Count a finished request towards a request-bounded profile"""
+        if self._remaining is None:
+            return
+        with self._count_lock:
+            if self._remaining is None:
+                return
+            self._remaining -= 1
+            if self._remaining <= 0:
+                self._done.set()
+
+    def _label(self, frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _sample(self, counts, skip):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == skip:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(self._label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            counts[';'.join(reversed(stack))] += 1
+
+    def profile(self, seconds=None, requests=None, timeout=60.0, interval=None):
+        """Sample for seconds, or until requests more requests finish (at most timeout seconds).
+
+        Returns (collapsed stack counts, samples taken, seconds profiled).
+        The caller's own thread is left out of the samples.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running")
+        try:
+            interval = interval or self.interval
+            duration = min(seconds, timeout) if seconds else timeout
+            self._done.clear()
+            with self._count_lock:
+                self._remaining = requests if requests else None
+            counts = Counter()
+            caller = threading.get_ident()
+            samples = 0
+            started = time.perf_counter()
+            deadline = started + duration
+            while not self._done.wait(interval):
+                self._sample(counts, caller)
+                samples += 1
+                if time.perf_counter() >= deadline:
+                    break
+            return counts, samples, time.perf_counter() - started
+        finally:
+            with self._count_lock:
+                self._remaining = None
+            self._lock.release()
+
+
+def collapsed(counts):
+    """Render stack counts in the collapsed format read by flamegraph.pl and speedscope"""
+    return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common())
@@ -1,11 +1,105 @@
+import json
+import os
+import sys
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 from memory import Memory # Corrected import path
 from decision_engine import DecisionEngine # Added import
 
-def launch_core():
+def launch_core(batch=None, output=None, concurrency=8, checkpoint=None):
     memory = Memory()
     brain = DecisionEngine(memory)
 
+    if batch is not None:
+        run_batch(brain, batch, output=output, concurrency=concurrency, checkpoint=checkpoint)
+        return
+
     while True:
         input_data = input(">> ")
-        response = brain.process(input_data)
+        # One local user, so the whole interactive conversation is one session
+        response = brain.process(input_data, session="cli")
         print(response)
+
+
+def _answer(brain, run_id, index, prompt):
+    # Each prompt gets its own session so answers don't depend on completion
+    # order, and each run its own sessions so reruns don't see old answers
+    record = {"index": index, "input": prompt}
+    try:
+        record["response"] = brain.process(prompt, session=f"batch-{run_id}-{index}")
+    except Exception as e:
+        record["error"] = str(e)
+    return record
+
+
+def _load_checkpoint(path, out):
+    """Return (prompts done, run id), cutting off output written after the checkpoint"""
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        # A fresh run; drop anything a run that crashed before its first checkpoint wrote
+        state = {"done": 0, "offset": 0}
+    out.seek(state["offset"])
+    out.truncate()
+    return state["done"], state.get("run") or uuid.uuid4().hex[:12]
+
+
+def _save_checkpoint(path, out, done, run_id):
+    out.flush()
+    os.fsync(out.fileno())
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"done": done, "offset": out.tell(), "run": run_id}, f)
+    os.replace(tmp, path)
+
+
+def run_batch(brain, source, output=None, concurrency=8, checkpoint=None, checkpoint_every=100):
+    """Answer one prompt per line of source ("-" for stdin) as ordered NDJSON.
+
+    Up to ``concurrency`` prompts are in flight while results are written in
+    input order. With an output file, progress is checkpointed to
+    ``<output>.ckpt`` (or ``checkpoint``) and a rerun resumes after the last
+    checkpoint as the same run (with the same memory sessions).
+    """
+    inputs = sys.stdin if source == "-" else open(source, encoding="utf-8")
+    if output and output != "-":
+        out = open(output, "a+", encoding="utf-8")
+        checkpoint = checkpoint or f"{output}.ckpt"
+    else:
+        out, checkpoint = sys.stdout, None
+    done, run_id = _load_checkpoint(checkpoint, out) if checkpoint else (0, uuid.uuid4().hex[:12])
+    if done:
+        print(f"[BATCH] Resuming after {done} prompts", file=sys.stderr)
+
+    # Keep a few results queued behind the oldest so workers stay busy while it finishes
+    window = concurrency * 2
+    pending = deque()
+
+    def write(record):
+        nonlocal done
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        done += 1
+        if checkpoint and done % checkpoint_every == 0:
+            _save_checkpoint(checkpoint, out, done, run_id)
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="kairo-batch") as pool:
+            for index, line in enumerate(inputs):
+                if index < done:
+                    continue
+                pending.append(pool.submit(_answer, brain, run_id, index, line.rstrip("\r\n")))
+                if len(pending) >= window:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+    finally:
+        if checkpoint:
+            _save_checkpoint(checkpoint, out, done, run_id)
+        if out is not sys.stdout:
+            out.close()
+        if inputs is not sys.stdin:
+            inputs.close()
+    print(f"[BATCH] {done} prompts answered", file=sys.stderr)
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+class ResponseCache:
+    """Two-tier (memory LRU + on-disk) cache for LLM responses.
+
+    Keys are derived from (model, personality, normalized input). Both
+    tiers are bounded by total value size in bytes and evict least
+    recently used entries first; entries expire after ``ttl`` seconds.
+    The disk index is per process, so a key missing from it is still
+    looked up on disk in case another worker has written it since.
+    """
+
+    def __init__(self, cache_dir=None, ttl=3600, max_memory_bytes=16 * 1024 * 1024,
+                 max_disk_bytes=256 * 1024 * 1024):
+        self.logger = logging.getLogger('KairoAI.ResponseCache')
+        self.cache_dir = Path(cache_dir) if cache_dir else Path.home() / '.kairoai' / 'cache' / 'responses'
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (expires_at, value, size)
+        self._memory_bytes = 0
+        self._disk = OrderedDict()  # key -> size, in access order
+        self._disk_bytes = 0
+        self.stats_counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0
+        }
+        self._scan_disk()
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache from KAIRO_CACHE_* settings, or None if disabled"""
+        if os.getenv('KAIRO_RESPONSE_CACHE', '1').lower() in ('0', 'false', 'no'):
+            return None
+        return cls(
+            cache_dir=os.getenv('KAIRO_CACHE_DIR'),
+            ttl=int(os.getenv('KAIRO_CACHE_TTL', '3600')),
+            max_memory_bytes=int(os.getenv('KAIRO_CACHE_MEMORY_BYTES', str(16 * 1024 * 1024))),
+            max_disk_bytes=int(os.getenv('KAIRO_CACHE_DISK_BYTES', str(256 * 1024 * 1024)))
+        )
+
+    @staticmethod
+    def normalize(text):
+        return " ".join(str(text).split()).lower()
+
+    @classmethod
+    def make_key(cls, model, personality, input_text, *extra):
+        payload = json.dumps([model, personality, cls.normalize(input_text), *extra])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _scan_disk(self):
+        """Rebuild the disk-tier index, oldest access first"""
+        entries = []
+        for path in self.cache_dir.glob('*/*.json'):
+            try:
+                st = path.stat()
+                entries.append((st.st_mtime, path.stem, st.st_size))
+            except OSError:
+                continue
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value, size = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.stats_counters['memory_hits'] += 1
+                    return value
+                self._drop_memory(key)
+                self.stats_counters['expired'] += 1
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            record = json.loads(data)
+        except FileNotFoundError:
+            with self._lock:
+                # Evicted, possibly by another worker; nothing left to delete
+                self._disk_bytes -= self._disk.pop(key, 0)
+                self.stats_counters['misses'] += 1
+            return None
+        except (OSError, ValueError):
+            data = record = None
+
+        with self._lock:
+            if record is None or record['expires_at'] <= now:
+                self._drop_disk(key)
+                self.stats_counters['expired' if record else 'misses'] += 1
+                return None
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            else:
+                # Written by another worker after this index was built
+                self._disk[key] = len(data)
+                self._disk_bytes += len(data)
+                self._evict_disk()
+            self.stats_counters['disk_hits'] += 1
+            self._put_memory(key, record['expires_at'], record['value'])
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return record['value']
+
+    def set(self, key, value):
+        """Store value in both tiers"""
+        expires_at = time.time() + self.ttl
+        data = json.dumps({'expires_at': expires_at, 'value': value}).encode('utf-8')
+        path = self._path(key)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            self.logger.error(f"Failed to write cache entry: {e}")
+            path = None
+
+        with self._lock:
+            self._put_memory(key, expires_at, value)
+            if path is not None:
+                self._disk_bytes -= self._disk.pop(key, 0)
+                self._disk[key] = len(data)
+                self._disk_bytes += len(data)
+                self._evict_disk()
+
+    def _put_memory(self, key, expires_at, value):
+        size = len(value.encode('utf-8')) if isinstance(value, str) else len(json.dumps(value))
+        if key in self._memory:
+            self._drop_memory(key)
+        if size > self.max_memory_bytes:
+            return
+        self._memory[key] = (expires_at, value, size)
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes:
+            old_key = next(iter(self._memory))
+            self._drop_memory(old_key)
+            self.stats_counters['evictions'] += 1
+
+    def _drop_memory(self, key):
+        _, _, size = self._memory.pop(key)
+        self._memory_bytes -= size
+
+    def _drop_disk(self, key):
+        self._disk_bytes -= self._disk.pop(key, 0)
+        try:
+            self._path(key).unlink()
+        except OSError:
+            pass
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            self._drop_disk(next(iter(self._disk)))
+            self.stats_counters['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._disk):
+                self._drop_disk(key)
+            self._memory.clear()
+            self._memory_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.stats_counters,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_bytes
+            }
@@ -1,2 +1,2 @@
 #!/bin/bash
-exec gunicorn -w 4 -b 0.0.0.0:5000 api_interface:app
+exec gunicorn -c gunicorn.conf.py api_interface:app
@@ -0,0 +1,94 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import psutil
+
+import tracing
+
+
+class SystemSampler:
+    """Background thread keeping a snapshot of system, process and wallet state.
+
+    Request handlers read ``snapshot()`` instead of calling psutil or the
+    wallet themselves, so health and status checks cost a dict lookup.
+    CPU percentages are measured over the sampling interval.
+    """
+
+    def __init__(self, interval=5.0, btc_manager=None):
+        self.logger = logging.getLogger('KairoAI.SystemSampler')
+        self.interval = interval
+        self.btc_manager = btc_manager
+        self._snapshot = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._process = None
+
+    def start(self):
+        """Start sampling in this process (safe to call again after a fork)"""
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._process = psutil.Process()
+            self._stop.clear()
+            # Prime the CPU counters so the first snapshot has real percentages
+            psutil.cpu_percent(interval=None)
+            self._process.cpu_percent(interval=None)
+            self._snapshot = self._sample()
+            self._thread = threading.Thread(target=self._run, name='kairo-system-sampler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread and self._pid == os.getpid():
+            self._thread.join()
+
+    def snapshot(self):
+        """Return the latest snapshot; never blocks on a measurement"""
+        if self._pid != os.getpid():
+            self.start()
+        return self._snapshot
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                # Replace, never mutate, so readers always see a whole snapshot
+                with tracing.span('system_sample'):
+                    self._snapshot = self._sample()
+            except Exception as e:
+                self.logger.error(f"System sampling failed: {e}")
+
+    def _sample(self):
+        memory_info = self._process.memory_info()
+        return {
+            'sampled_at': datetime.now().isoformat(),
+            'sampled_monotonic': time.monotonic(),
+            'system': {
+                'cpu_percent': psutil.cpu_percent(interval=None),
+                'memory_percent': psutil.virtual_memory().percent,
+                'disk_percent': psutil.disk_usage('/').percent,
+                'uptime': psutil.boot_time()
+            },
+            'process': {
+                'pid': self._pid,
+                'memory_info': dict(memory_info._asdict()),
+                'cpu_percent': self._process.cpu_percent(interval=None),
+                'num_threads': self._process.num_threads()
+            },
+            'bitcoin': self._sample_wallet()
+        }
+
+    def _sample_wallet(self):
+        if self.btc_manager is None:
+            return {'status': 'disabled', 'balance': None}
+        if not self.btc_manager.wallet:
+            return {'status': 'no_wallet', 'balance': None}
+        try:
+            return {'status': 'operational', 'balance': self.btc_manager.get_balance()}
+        except Exception as e:
+            return {'status': 'error', 'balance': None, 'error': str(e)}
@@ -0,0 +1,138 @@
+"""In-process request tracing.
+
+Spans are timed blocks (``metrics.timed`` stages, LLM backend calls,
+BitcoinArmory operations) tagged with the request ID from log_pipeline and
+the span that encloses them. Finished spans go into a fixed-size ring, so
+the cost of a span is two clock reads and a deque append, and memory use
+is bounded. Set KAIRO_TRACE=0 to turn spans off entirely.
+"""
+import contextvars
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+import log_pipeline
+
+ENABLED = os.getenv('KAIRO_TRACE', '1').lower() not in ('0', 'false', 'no')
+
+# Finished spans, oldest first; appends are atomic so recording takes no lock
+_ring = deque(maxlen=int(os.getenv('KAIRO_TRACE_SPANS', '10000')))
+_ids = itertools.count(1)
+# The open span; a context variable so LLM tasks and coalesced calls nest correctly
+_current = contextvars.ContextVar('span', default=None)
+_disabled = nullcontext()
+
+
+def record(name, start, duration, trace_id=None, parent=None, error=None, **attrs):
+    """Add a finished span; start is wall-clock seconds, duration seconds"""
+    if not ENABLED:
+        return None
+    if parent is None:
+        parent = _current.get()
+    span_id = next(_ids)
+    _ring.append({
+        'trace_id': trace_id,
+        'span_id': span_id,
+        'parent_id': parent,
+        'name': name,
+        'start': start,
+        'duration_ms': round(duration * 1000, 3),
+        'thread': threading.current_thread().name,
+        'error': error,
+        **attrs
+    })
+    return span_id
+
+
+class _Span:
+    __slots__ = ('name', 'trace_id', 'parent', 'attrs', 'span_id', 'token', 'started', 'start')
+
+    def __init__(self, name, trace_id, parent, attrs):
+        self.name = name
+        self.trace_id = trace_id
+        self.parent = parent
+        self.attrs = attrs
+
+    def __enter__(self):
+        if self.parent is None:
+            self.parent = _current.get()
+        self.span_id = next(_ids)
+        self.token = _current.set(self.span_id)
+        self.started = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(exc_type.__name__ if exc_type else None)
+
+    def close(self, error=None):
+        duration = time.perf_counter() - self.start
+        try:
+            _current.reset(self.token)
+        except ValueError:  # closed from another context
+            _current.set(self.parent)
+        _ring.append({
+            'trace_id': self.trace_id if self.trace_id is not None else log_pipeline.request_id.get(),
+            'span_id': self.span_id,
+            'parent_id': self.parent,
+            'name': self.name,
+            'start': self.started,
+            'duration_ms': round(duration * 1000, 3),
+            'thread': threading.current_thread().name,
+            'error': error,
+            **self.attrs
+        })
+
+
+def span(name, trace_id=None, parent=None, **attrs):
+    """Context manager recording the enclosed block as a span.
+
+    The trace ID defaults to the current request ID and the parent to the
+    current span. Spans opened inside it (including in tasks and coalesced
+    calls started from it) become its children.
+    """
+    if not ENABLED:
+        return _disabled
+    return _Span(name, trace_id, parent, attrs)
+
+
+def start(name, trace_id=None, **attrs):
+    """Open a span to be closed with finish() (for code that can't use a with block)"""
+    if not ENABLED:
+        return None
+    return _Span(name, trace_id, None, attrs).__enter__()
+
+
+def finish(handle, error=None):
+    """Close a span opened by start(); the enclosing span becomes current again"""
+    if handle is not None:
+        handle.close(error)
+
+
+def current():
+    """(trace ID, span ID) to hand to work continued on another thread"""
+    return log_pipeline.request_id.get(), _current.get()
+
+
+def spans(limit=200, trace_id=None, name=None, min_ms=None):
+    """Return up to limit of the newest matching spans, oldest first"""
+    found = []
+    for entry in reversed(list(_ring)):
+        if trace_id is not None and entry['trace_id'] != trace_id:
+            continue
+        if name is not None and not entry['name'].startswith(name):
+            continue
+        if min_ms is not None and entry['duration_ms'] < min_ms:
+            continue
+        found.append(entry)
+        if len(found) >= limit:
+            break
+    found.reverse()
+    return found
+
+
+def stats():
+    return {'enabled': ENABLED, 'spans': len(_ring), 'capacity': _ring.maxlen}
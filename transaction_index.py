@@ -0,0 +1,165 @@
+import os
+import json
+import base64
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+
+# Unconfirmed transactions sort ahead of every block
+UNCONFIRMED = 2 ** 62
+
+class TransactionIndex:
+    """On-disk index of one wallet's transaction history
+
+    Transactions live in a SQLite database (WAL mode, one connection per
+    thread, all closed by ``close()``) keyed by txid and ordered by block height, so pages at any
+    depth are an index range scan. ``sync()`` only asks the wallet for
+    transactions above the last synced height, minus ``reorg_depth``
+    blocks that are re-read and replaced on every sync so transactions
+    moved or dropped by a reorg are corrected. Unconfirmed transactions
+    are always replaced.
+    """
+
+    def __init__(self, path, reorg_depth=6, fetch_size=256):
+        self.logger = logging.getLogger('KairoAI.TransactionIndex')
+        self.db_path = Path(path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.reorg_depth = reorg_depth
+        self.fetch_size = fetch_size
+        self.sync_lock = threading.Lock()
+        self._local = threading.local()
+        self._conns = []  # (pid, connection) for every thread, so close() reaches them all
+        self._conns_lock = threading.Lock()
+
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        with conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS transactions ('
+                'txid TEXT PRIMARY KEY, height INTEGER NOT NULL, '
+                'amount INTEGER NOT NULL, timestamp INTEGER NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS tx_order ON transactions (height DESC, txid DESC)')
+            conn.execute('CREATE INDEX IF NOT EXISTS tx_time ON transactions (timestamp)')
+            conn.execute('CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER)')
+
+    def _conn(self):
+        # Connections must not be shared across threads or inherited by forks
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            # Each thread still uses only its own; this just lets close() run on any thread
+            conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            with self._conns_lock:
+                self._conns.append((os.getpid(), conn))
+        return conn
+
+    @property
+    def synced_height(self):
+        row = self._conn().execute("SELECT value FROM state WHERE key = 'synced_height'").fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _row(tx, tip):
+        height = getattr(tx, 'getBlockHeight', None)
+        if height is not None:
+            height = height()
+        else:
+            confirmations = tx.getConfirmations()
+            height = tip - confirmations + 1 if confirmations and tip is not None else -1
+        return (tx.getHash(), height if height >= 0 else UNCONFIRMED, tx.getValue(), tx.getTimestamp())
+
+    def sync(self, wallet, tip):
+        """Bring the index up to date with wallet at chain height tip"""
+        with self.sync_lock:
+            synced = self.synced_height
+            if synced is not None and tip is not None and tip < synced:
+                synced = tip  # the chain got shorter; rewind past the reorg
+            floor = None if synced is None else synced - self.reorg_depth
+
+            # History comes newest first; widen the window until it reaches the floor
+            count = self.fetch_size
+            while True:
+                rows = [self._row(tx, tip) for tx in wallet.getTransactions(count)]
+                exhausted = len(rows) < count
+                confirmed = [row[1] for row in rows if row[1] != UNCONFIRMED]
+                if exhausted or (floor is not None and confirmed and min(confirmed) <= floor):
+                    break
+                count *= 2
+            if floor is not None:
+                rows = [row for row in rows if row[1] > floor]
+
+            conn = self._conn()
+            with conn:
+                if floor is None:
+                    conn.execute('DELETE FROM transactions')
+                else:
+                    conn.execute('DELETE FROM transactions WHERE height > ?', (floor,))
+                conn.executemany('INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?)', rows)
+                if tip is not None:
+                    conn.execute("INSERT OR REPLACE INTO state VALUES ('synced_height', ?)", (tip,))
+            self.logger.info(f"Indexed {len(rows)} transactions up to height {tip}")
+            return {'synced_height': tip, 'updated': len(rows)}
+
+    @staticmethod
+    def _encode_cursor(row):
+        return base64.urlsafe_b64encode(json.dumps([row[1], row[0]]).encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor):
+        try:
+            height, txid = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return int(height), str(txid)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+
+    def query(self, limit=10, cursor=None, since=None, until=None, min_amount=None, max_amount=None, direction=None, tip=None):
+        """Return (transactions, next cursor), newest first
+
+        since/until filter on timestamp, min_amount/max_amount on the
+        signed amount, and direction is 'in' or 'out'. Pass the cursor
+        from the previous page to continue; it is None on the last page.
+        """
+        clauses, args = [], []
+        if cursor:
+            height, txid = self._decode_cursor(cursor)
+            clauses.append('(height < ? OR (height = ? AND txid < ?))')
+            args += [height, height, txid]
+        for clause, value in (('timestamp >= ?', since), ('timestamp <= ?', until),
+                              ('amount >= ?', min_amount), ('amount <= ?', max_amount)):
+            if value is not None:
+                clauses.append(clause)
+                args.append(value)
+        if direction == 'in':
+            clauses.append('amount > 0')
+        elif direction == 'out':
+            clauses.append('amount < 0')
+        elif direction is not None:
+            raise ValueError(f"Unknown direction: {direction}")
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self._conn().execute(
+            f'SELECT txid, height, amount, timestamp FROM transactions {where} '
+            'ORDER BY height DESC, txid DESC LIMIT ?', args + [limit + 1]
+        ).fetchall()
+        next_cursor = self._encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return [{
+            'txid': txid,
+            'amount': amount,
+            'timestamp': timestamp,
+            'height': height if height != UNCONFIRMED else None,
+            'confirmations': max(0, tip - height + 1) if tip is not None and height != UNCONFIRMED else 0
+        } for txid, height, amount, timestamp in rows[:limit]], next_cursor
+
+    def close(self):
+        """Close the connections of every thread in this process"""
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for pid, conn in conns:
+            # A connection inherited through fork belongs to the parent
+            if pid == os.getpid():
+                conn.close()
+        self._local.conn = None
@@ -0,0 +1,409 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:  # fall back to zlib
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: the service runs a single API process
+    fcntl = None
+
+FREQUENCIES = {'hourly': 3600, 'daily': 86400, 'weekly': 7 * 86400}
+
+
+def parse_frequency(value, default=86400):
+    """Seconds between backups from "hourly"/"daily"/"weekly" or a number of seconds"""
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return FREQUENCIES.get(str(value).lower()) or float(value)
+    except ValueError:
+        logging.getLogger('KairoAI.WalletBackup').warning(f"Unknown backup_frequency {value!r}; backing up daily")
+        return default
+
+
+class Throttle:
+    """Limits backup I/O to ``rate`` bytes per second (0 for no limit).
+
+    While ``busy()`` is true (e.g. wallet operations are queued) it also
+    holds off, for at most ``max_yield`` seconds per call, so a backup
+    never competes with a request for the disk.
+    """
+
+    def __init__(self, rate=0, busy=None, max_yield=5.0):
+        self.rate = rate
+        self.busy = busy
+        self.max_yield = max_yield
+        self._allowance = 0.0
+        self._last = time.monotonic()
+
+    def consume(self, nbytes, stop=None):
+        if self.busy is not None:
+            deadline = time.monotonic() + self.max_yield
+            while self.busy() and time.monotonic() < deadline:
+                if stop is not None and stop.wait(0.05):
+                    return
+                if stop is None:
+                    time.sleep(0.05)
+        if not self.rate:
+            return
+        now = time.monotonic()
+        self._allowance = min(self.rate, self._allowance + (now - self._last) * self.rate) - nbytes
+        self._last = now
+        if self._allowance < 0:
+            delay = -self._allowance / self.rate
+            if stop is not None:
+                stop.wait(delay)
+            else:
+                time.sleep(delay)
+
+
+class BackupEngine:
+    """Incremental, deduplicated snapshots of wallet files.
+
+    Every ``interval`` seconds a background thread checks the files in
+    ``sources`` (a list of (directory, glob pattern) pairs). Files whose
+    size and mtime match the previous run are not read again; the rest
+    are hashed, and content not stored yet is compressed into
+    ``objects/<sha256>`` (zstandard if installed, otherwise zlib). A
+    snapshot is a manifest in ``snapshots/`` mapping file names to
+    digests, written only when something changed, so unchanged wallets
+    cost a stat call and identical content is stored once. The newest
+    ``keep_last`` snapshots and any younger than ``keep_days`` are kept;
+    objects no snapshot refers to are then deleted.
+
+    Reads and writes go through a Throttle, and a file that changes while
+    it is read is retried on the next run instead of being backed up
+    half-written. A lock file lets only one process back up at a time.
+    """
+
+    def __init__(self, sources, backup_dir, interval=86400, keep_last=14, keep_days=30,
+                 rate=8 * 1024 * 1024, busy=None, chunk_size=256 * 1024, initial_delay=60.0):
+        self.logger = logging.getLogger('KairoAI.WalletBackup')
+        self.sources = [(Path(directory), pattern) for directory, pattern in sources]
+        self.path = Path(backup_dir)
+        self.interval = interval
+        self.keep_last = keep_last
+        self.keep_days = keep_days
+        self.chunk_size = chunk_size
+        self.initial_delay = initial_delay
+        self.throttle = Throttle(rate, busy)
+        self.codec = 'zst' if zstandard is not None else 'zz'
+        self.stats_counters = {'runs': 0, 'snapshots': 0, 'files_hashed': 0, 'objects_written': 0,
+                               'bytes_written': 0, 'objects_pruned': 0, 'skipped_locked': 0, 'failures': 0}
+        self.last_run = None
+        self.last_error = None
+
+        self._state = {}  # file key -> [size, mtime_ns, digest]
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._run_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    @classmethod
+    def from_config(cls, config, config_path, busy=None):
+        """Engine for a BitcoinArmoryManager config, or None if auto_backup is off"""
+        if not config.get('auto_backup'):
+            return None
+        security = config.get('security', {})
+        return cls(
+            sources=[(config['wallet_path'], '*.wallet'), (config_path, 'config.json')],
+            backup_dir=config.get('backup_dir') or Path(config_path) / 'backups',
+            interval=parse_frequency(config.get('backup_frequency', security.get('backup_frequency'))),
+            keep_last=config.get('backup_keep_last', 14),
+            keep_days=config.get('backup_keep_days', 30),
+            rate=config.get('backup_rate_limit', 8 * 1024 * 1024),
+            busy=busy
+        )
+
+    # -- scheduling ------------------------------------------------------
+
+    def start(self):
+        # A thread does not survive a fork; each process starts its own
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='kairo-wallet-backup', daemon=True)
+        self._thread.start()
+        self._pid = os.getpid()
+
+    def stop(self, timeout=10):
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def trigger(self):
+        """Ask the background thread to back up now; returns False if it isn't running"""
+        if self._thread is None or self._pid != os.getpid():
+            return False
+        self._wake.set()
+        return True
+
+    def _run(self):
+        try:
+            # Lowest CPU priority for this thread only (Linux)
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        last = self._latest_snapshot_time()
+        delay = self.initial_delay if last is None else max(self.initial_delay, last + self.interval - time.time())
+        while True:
+            self._wake.wait(delay)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            try:
+                self.run_once()
+            except Exception as e:
+                self.stats_counters['failures'] += 1
+                self.last_error = str(e)
+                self.logger.error(f"Wallet backup failed: {e}")
+            delay = self.interval
+
+    # -- backup ----------------------------------------------------------
+
+    def _files(self):
+        for directory, pattern in self.sources:
+            if directory.exists():
+                for path in sorted(directory.glob(pattern)):
+                    if path.is_file():
+                        yield f"{directory.name}/{path.name}", path
+
+    def _object_path(self, digest, codec=None):
+        return self.path / 'objects' / digest[:2] / f"{digest}.{codec or self.codec}"
+
+    def _has_object(self, digest):
+        return any(self._object_path(digest, codec).exists() for codec in ('zst', 'zz'))
+
+    def _compress(self, data):
+        if self.codec == 'zst':
+            return zstandard.ZstdCompressor(level=10).compress(data)
+        return zlib.compress(data, 9)
+
+    def _read(self, path):
+        """Return (data, stat) read in throttled chunks, or None if the file changed meanwhile"""
+        before = path.stat()
+        parts = []
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                parts.append(chunk)
+                self.throttle.consume(len(chunk), self._stop)
+        after = path.stat()
+        if (before.st_size, before.st_mtime_ns) != (after.st_size, after.st_mtime_ns):
+            return None
+        return b''.join(parts), after
+
+    def _store(self, digest, data):
+        target = self._object_path(digest)
+        if self._has_object(digest):
+            return False
+        target.parent.mkdir(parents=True, exist_ok=True)
+        compressed = self._compress(data)
+        self.throttle.consume(len(compressed), self._stop)
+        tmp = target.with_name(f"{target.name}.tmp")
+        with open(tmp, 'wb') as f:
+            f.write(compressed)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, target)
+        self.stats_counters['objects_written'] += 1
+        self.stats_counters['bytes_written'] += len(compressed)
+        return True
+
+    def _exclusive(self):
+        """Try to take the backup directory's lock; returns the open lock file or None"""
+        lock_file = open(self.path / 'LOCK', 'a+b')
+        if fcntl:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return None
+        return lock_file
+
+    def run_once(self):
+        """Back up changed files now; returns the new snapshot's id, or None if nothing changed"""
+        with self._run_lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            lock_file = self._exclusive()
+            if lock_file is None:
+                # Another worker process is backing up
+                self.stats_counters['skipped_locked'] += 1
+                return None
+            try:
+                self.stats_counters['runs'] += 1
+                self.last_run = time.time()
+                return self._snapshot()
+            finally:
+                lock_file.close()
+
+    def _snapshot(self):
+        if not self._state:
+            self._state = self._load_state()
+        previous = self._latest_manifest()
+        files = {}
+        for key, path in self._files():
+            if self._stop.is_set():
+                return None
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            known = self._state.get(key)
+            if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns and self._has_object(known[2]):
+                digest = known[2]
+            else:
+                try:
+                    read = self._read(path)
+                except FileNotFoundError:
+                    read = None  # deleted since it was listed
+                if read is None:
+                    # Being written or removed right now; keep the previous copy and retry next run
+                    self.logger.info(f"{key} changed while reading; will retry")
+                    if previous and key in previous['files']:
+                        files[key] = previous['files'][key]
+                    continue
+                data, stat = read
+                digest = hashlib.sha256(data).hexdigest()
+                self.stats_counters['files_hashed'] += 1
+                self._store(digest, data)
+                self._state[key] = [stat.st_size, stat.st_mtime_ns, digest]
+            files[key] = {'digest': digest, 'size': stat.st_size, 'mtime': stat.st_mtime}
+        self._save_state()
+
+        if previous is not None and previous['files'] == files:
+            return None
+        created = time.time()
+        snapshot_id = datetime.fromtimestamp(created).strftime('%Y%m%dT%H%M%S%f')
+        manifest = {'id': snapshot_id, 'created': created, 'files': files}
+        snapshots = self.path / 'snapshots'
+        snapshots.mkdir(exist_ok=True)
+        tmp = snapshots / f"{snapshot_id}.json.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, snapshots / f"{snapshot_id}.json")
+        self.stats_counters['snapshots'] += 1
+        self.logger.info(f"Wallet backup snapshot {snapshot_id}: {len(files)} files")
+        self._prune()
+        return snapshot_id
+
+    # -- manifests and retention -----------------------------------------
+
+    def _load_state(self):
+        try:
+            with open(self.path / 'state.json') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_state(self):
+        tmp = self.path / 'state.json.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self._state, f)
+        os.replace(tmp, self.path / 'state.json')
+
+    def _manifest_paths(self):
+        snapshots = self.path / 'snapshots'
+        return sorted(snapshots.glob('*.json')) if snapshots.exists() else []
+
+    def _latest_manifest(self):
+        paths = self._manifest_paths()
+        if not paths:
+            return None
+        with open(paths[-1]) as f:
+            return json.load(f)
+
+    def _latest_snapshot_time(self):
+        paths = self._manifest_paths()
+        return paths[-1].stat().st_mtime if paths else None
+
+    def _prune(self):
+        paths = self._manifest_paths()
+        cutoff = time.time() - self.keep_days * 86400
+        keep = set(paths[-self.keep_last:]) if self.keep_last else set()
+        for path in paths:
+            if path not in keep and path.stat().st_mtime < cutoff:
+                path.unlink()
+        referenced = set()
+        for path in self._manifest_paths():
+            with open(path) as f:
+                referenced.update(entry['digest'] for entry in json.load(f)['files'].values())
+        for obj in (self.path / 'objects').glob('*/*'):
+            if obj.name.split('.', 1)[0] not in referenced and not obj.name.endswith('.tmp'):
+                obj.unlink()
+                self.stats_counters['objects_pruned'] += 1
+
+    def snapshots(self):
+        """Summaries of the retained snapshots, oldest first"""
+        found = []
+        for path in self._manifest_paths():
+            with open(path) as f:
+                manifest = json.load(f)
+            found.append({
+                'id': manifest['id'],
+                'created': datetime.fromtimestamp(manifest['created']).isoformat(),
+                'files': len(manifest['files']),
+                'bytes': sum(entry['size'] for entry in manifest['files'].values())
+            })
+        return found
+
+    def restore(self, snapshot_id, target_dir):
+        """Write the files of a snapshot under target_dir; returns the paths written"""
+        with open(self.path / 'snapshots' / f"{snapshot_id}.json") as f:
+            manifest = json.load(f)
+        target_dir = Path(target_dir)
+        written = []
+        for key, entry in manifest['files'].items():
+            for codec in ('zst', 'zz'):
+                source = self._object_path(entry['digest'], codec)
+                if source.exists():
+                    break
+            else:
+                raise FileNotFoundError(f"Backup object missing for {key}")
+            with open(source, 'rb') as f:
+                raw = f.read()
+            if codec == 'zst':
+                if zstandard is None:
+                    raise RuntimeError(f"{source.name} needs the zstandard package")
+                data = zstandard.ZstdDecompressor().decompress(raw)
+            else:
+                data = zlib.decompress(raw)
+            if hashlib.sha256(data).hexdigest() != entry['digest']:
+                raise ValueError(f"Backup object for {key} is corrupt")
+            path = target_dir / key
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+            written.append(str(path))
+        return written
+
+    def stats(self):
+        return {
+            **self.stats_counters,
+            'interval': self.interval,
+            'last_run': datetime.fromtimestamp(self.last_run).isoformat() if self.last_run else None,
+            'last_error': self.last_error,
+            'codec': self.codec
+        }